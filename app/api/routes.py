@@ -3,28 +3,69 @@ import csv
 import json
 import traceback
 import shutil  # For file operations
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
+from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 import tempfile
+import zipfile
 import logging
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import xlsxwriter
 import time
+import aiofiles
 
-from app.db.database import get_db
-from app.models.models import Document, LineItem, ProductCatalog, ProductMatch
+from app.db.database import get_db, get_async_db
+from app.models.models import Document, LineItem, ProductMatch, Job
 from app.schemas.schemas import (
     Document as DocumentSchema,
+    DocumentPage as DocumentPageSchema,
     DocumentUploadResponse,
     UpdateMatchRequest,
     SearchProductRequest,
-    ProductCatalog as ProductCatalogSchema
+    SearchProductBatchRequest,
+    ProductCatalog as ProductCatalogSchema,
+    Job as JobSchema,
+    JobSubmitRequest,
+    Batch as BatchSchema,
+    BlobStats as BlobStatsSchema
+)
+from app.services.document_service import (
+    extract_document_content_async as extract_content_service_async,
+    match_line_items,
+    save_extracted_items,
+    match_and_save_line_items,
+    list_document_summaries,
+    get_document_pdf_path,
+    get_document_with_matches
+)
+from app.services.custom_matcher import match_line_items_custom
+from app.services.catalog_index import CATALOG_CSV_PATH, invalidate_catalog_index
+from app.services.catalog_import import import_catalog_csv
+from app.services.product_search import search_products as search_catalog, search_products_batch as search_catalog_batch
+from app.services.extraction_cache import get_cache_stats, clear_extraction_cache
+from app.services.job_service import JOB_KINDS, submit_job, submit_batch, get_batch_status
+from app.services.upload_service import (
+    MAX_ARCHIVE_SIZE,
+    UploadTooLargeError,
+    stream_upload_to_disk,
+    unpack_pdfs_from_zip,
+    discard_upload
+)
+from app.services.file_delivery import serve_file
+from app.services.profiling import list_profiles, get_profile_path
+from app.services.blob_store import (
+    BLOB_STORE_DIR,
+    add_blob_reference,
+    store_blob,
+    settle_blob,
+    release_blob,
+    delete_blob_file,
+    record_extraction,
+    get_blob_stats
 )
-from app.services.document_service import extract_document_content as extract_content_service, match_line_items
-from app.services.custom_matcher import match_line_items_custom, calculate_similarity, preprocess_text
-from app.services.pdf_extraction_service import extract_document_content_with_llm
 
 # Configure logging
 logging.basicConfig(
@@ -42,7 +83,7 @@ router = APIRouter()
 @router.post("/documents/upload", response_model=DocumentUploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a PDF document and save it to disk.
@@ -59,32 +100,52 @@ async def upload_document(
             detail="Only PDF files are accepted"
         )
     
+    temp_path = None
+    
     try:
-        # Save document information to database (without processing)
+        # Stream the file to disk in chunks, hashing it on the way
+        temp_path, sha256, file_size = await stream_upload_to_disk(file, BLOB_STORE_DIR)
+        logger.info(f"Received {file_size} bytes (sha256 {sha256})")
+        
+        # Save document information to database (without processing) once
+        # the file is durable
         logger.info("Creating document record in database")
-        db_document = Document(filename=file.filename)
+        db_document = Document(filename=file.filename, sha256=sha256, file_size=file_size)
         db.add(db_document)
-        db.commit()
-        db.refresh(db_document)
+        await db.flush()
+        
+        # Reference the file by its hash in the transaction that adds the
+        # document and store it unless the same bytes are stored already
+        await db.run_sync(add_blob_reference, sha256, file_size)
+        if await store_blob(temp_path, sha256):
+            logger.info(f"Stored file {get_document_pdf_path(db_document)}")
+            temp_path = None
         
-        # Create filename for saved PDF
-        file_path = os.path.join(UPLOAD_DIR, f"document_{db_document.id}.pdf")
+        await db.commit()
         
-        # Save the file to disk
-        logger.info(f"Saving file to {file_path}")
-        with open(file_path, "wb") as pdf_file:
-            content = await file.read()
-            pdf_file.write(content)
+        # A duplicate is only dropped once the reference is committed
+        if temp_path is not None:
+            await settle_blob(temp_path, sha256)
+            temp_path = None
         
         # Return basic information about the document
         return {
             "document_id": db_document.id,
             "filename": db_document.filename,
+            "sha256": sha256,
             "items": []  # No items processed yet
         }
     
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload {file.filename}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        await discard_upload(temp_path)
         logger.error(f"Error uploading document: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(
@@ -92,10 +153,112 @@ async def upload_document(
             detail=f"An error occurred: {str(e)}"
         )
 
+@router.post("/batches", response_model=BatchSchema, status_code=status.HTTP_202_ACCEPTED)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Upload many PDFs and/or ZIP archives of PDFs in one request and process
+    them in the background. Returns the batch with a job per document;
+    poll GET /batches/{batch_id} for their progress. Files that are not PDFs,
+    too large or unreadable are listed in rejected.
+    """
+    logger.info(f"Uploading batch of {len(files)} files")
+    
+    uploads = []  # (filename, temporary path, sha256, size)
+    rejected = []
+    
+    try:
+        # Stream every PDF, and every PDF inside an archive, to disk
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".pdf"):
+                try:
+                    temp_path, sha256, file_size = await stream_upload_to_disk(file, BLOB_STORE_DIR)
+                except UploadTooLargeError as e:
+                    logger.warning(f"Rejected upload {name}: {str(e)}")
+                    rejected.append(name)
+                    continue
+                uploads.append((name, temp_path, sha256, file_size))
+            elif name.lower().endswith(".zip"):
+                try:
+                    archive_path, _, _ = await stream_upload_to_disk(file, BLOB_STORE_DIR, max_size=MAX_ARCHIVE_SIZE)
+                except UploadTooLargeError as e:
+                    logger.warning(f"Rejected archive {name}: {str(e)}")
+                    rejected.append(name)
+                    continue
+                try:
+                    members, rejected_members = await run_in_threadpool(unpack_pdfs_from_zip, archive_path, BLOB_STORE_DIR)
+                except zipfile.BadZipFile:
+                    logger.warning(f"Rejected invalid archive {name}")
+                    rejected.append(name)
+                    continue
+                finally:
+                    await discard_upload(archive_path)
+                uploads.extend(members)
+                rejected.extend(f"{name}/{member}" for member in rejected_members)
+            else:
+                rejected.append(name)
+        
+        if not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No PDF files found in the upload"
+            )
+        
+        # Record the documents and store their files in one transaction
+        document_ids = []
+        for index, (name, temp_path, sha256, file_size) in enumerate(uploads):
+            db_document = Document(filename=name, sha256=sha256, file_size=file_size)
+            db.add(db_document)
+            await db.flush()
+            await db.run_sync(add_blob_reference, sha256, file_size)
+            if await store_blob(temp_path, sha256):
+                uploads[index] = (name, None, sha256, file_size)
+            document_ids.append(db_document.id)
+        await db.commit()
+        
+        # Duplicates are only dropped once the references are committed
+        for index, (name, temp_path, sha256, file_size) in enumerate(uploads):
+            if temp_path is not None:
+                await settle_blob(temp_path, sha256)
+                uploads[index] = (name, None, sha256, file_size)
+        
+        batch = await db.run_sync(submit_batch, document_ids, rejected)
+        return await db.run_sync(get_batch_status, batch.id)
+    
+    except HTTPException:
+        await discard_upload(*(temp_path for _, temp_path, _, _ in uploads))
+        raise
+    
+    except Exception as e:
+        await db.rollback()
+        await discard_upload(*(temp_path for _, temp_path, _, _ in uploads))
+        logger.error(f"Error uploading batch: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred: {str(e)}"
+        )
+
+@router.get("/batches/{batch_id}", response_model=BatchSchema)
+def get_batch(batch_id: int, db: Session = Depends(get_db)):
+    """
+    Get the status of a batch upload and the job status of each document
+    """
+    batch_status = get_batch_status(db, batch_id)
+    if batch_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Batch with ID {batch_id} not found"
+        )
+    return batch_status
+
 @router.post("/documents/{document_id}/extract")
 async def extract_document_content(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Extract content from a previously uploaded PDF document.
@@ -105,7 +268,7 @@ async def extract_document_content(
     
     try:
         # Get document from database
-        db_document = db.query(Document).filter(Document.id == document_id).first()
+        db_document = await db.get(Document, document_id)
         if db_document is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -113,104 +276,64 @@ async def extract_document_content(
             )
         
         # Path to saved PDF
-        file_path = os.path.join(UPLOAD_DIR, f"document_{document_id}.pdf")
+        file_path = get_document_pdf_path(db_document)
         if not os.path.exists(file_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"PDF file for document {document_id} not found"
             )
         
-        # Extract content from document
+        # Read the PDF without blocking the event loop
         logger.info(f"Opening file: {file_path}")
-        with open(file_path, "rb") as file_content:
-            # Extract content from document
-            logger.info("Calling extraction API")
-            extracted_content = extract_content_service(file_content)
-            
-            # Process extracted line items
-            if not extracted_content:
-                logger.error("Extraction API returned empty content")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to extract content from document"
-                )
-            
-            # Check if we received an error response
-            if len(extracted_content) == 1 and "error" in extracted_content[0]:
-                logger.warning(f"Extraction API error: {extracted_content[0]['error']}")
-                # Return the error as a response instead of raising exception
-                # This allows the frontend to display the error message
-                return {
-                    "document_id": db_document.id,
-                    "filename": db_document.filename,
-                    "items": extracted_content,
-                    "error": extracted_content[0]['error']
-                }
-            
-            logger.info(f"Extracted {len(extracted_content)} items")
-            
-            # Process results and save to database
-            extracted_items = []
-            
-            # Check if the first item is a table structure item
-            table_data = None
-            if extracted_content and extracted_content[0].get("description") == "TABLE_STRUCTURE" and "table_data" in extracted_content[0]:
-                table_data = extracted_content[0]["table_data"]
-            
-            # If we have table data, add it to the response
-            if table_data:
-                extracted_items.append({
-                    "description": "TABLE_STRUCTURE",
-                    "quantity": 1,
-                    "table_data": table_data
-                })
-            
-            # Process each item
-            for item in extracted_content:
-                # Skip the table structure item when saving individual items
-                if item.get("description") == "TABLE_STRUCTURE":
-                    continue
-                
-                if "description" not in item:
-                    logger.warning(f"Skipping item without description: {item}")
-                    continue
-                
-                description = item["description"]
-                quantity = item.get("quantity", 1)
-                
-                # Create line item in database
-                logger.info(f"Creating line item: {description}")
-                db_line_item = LineItem(
-                    document_id=db_document.id,
-                    description=description,
-                    quantity=quantity
-                )
-                db.add(db_line_item)
-                db.flush()  # Get ID without committing transaction
-                
-                # Add line item to response
-                extracted_item = {
-                    "id": db_line_item.id,
-                    "description": description,
-                    "quantity": quantity,
-                    "matches": []  # No matches yet
-                }
-                extracted_items.append(extracted_item)
-            
-            # Commit all database changes
-            logger.info("Committing all database changes")
-            db.commit()
-            
-            logger.info(f"Document extraction completed successfully: {db_document.id}")
-            
+        async with aiofiles.open(file_path, "rb") as pdf_file:
+            file_content = await pdf_file.read()
+        
+        # Extract content from document
+        logger.info("Calling extraction API")
+        extracted_content, source = await extract_content_service_async(file_content, db_document.sha256)
+        if db_document.sha256:
+            await db.run_sync(record_extraction, db_document.sha256, source)
+        
+        # Process extracted line items
+        if not extracted_content:
+            logger.error("Extraction API returned empty content")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to extract content from document"
+            )
+        
+        # Check if we received an error response
+        if len(extracted_content) == 1 and "error" in extracted_content[0]:
+            logger.warning(f"Extraction API error: {extracted_content[0]['error']}")
+            # Return the error as a response instead of raising exception
+            # This allows the frontend to display the error message
+            await db.commit()
             return {
                 "document_id": db_document.id,
                 "filename": db_document.filename,
-                "items": extracted_items
+                "items": extracted_content,
+                "error": extracted_content[0]['error']
             }
+        
+        logger.info(f"Extracted {len(extracted_content)} items")
+        
+        # Process results and save to database
+        extracted_items = await db.run_sync(save_extracted_items, db_document, extracted_content)
+        
+        # Commit all database changes
+        logger.info("Committing all database changes")
+        await db.commit()
+        
+        logger.info(f"Document extraction completed successfully: {db_document.id}")
+        
+        return {
+            "document_id": db_document.id,
+            "filename": db_document.filename,
+            "items": extracted_items
+        }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error extracting document content: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(
@@ -221,7 +344,7 @@ async def extract_document_content(
 @router.post("/documents/{document_id}/match")
 async def match_document_items(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Match line items of a document to product catalog.
@@ -231,7 +354,7 @@ async def match_document_items(
     
     try:
         # Get document from database
-        db_document = db.query(Document).filter(Document.id == document_id).first()
+        db_document = await db.get(Document, document_id)
         if db_document is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -239,7 +362,7 @@ async def match_document_items(
             )
         
         # Get line items for this document
-        line_items = db.query(LineItem).filter(LineItem.document_id == document_id).all()
+        line_items = (await db.scalars(select(LineItem).where(LineItem.document_id == document_id))).all()
         
         if not line_items:
             logger.warning(f"No line items found for document {document_id}")
@@ -249,64 +372,13 @@ async def match_document_items(
                 "items": []
             }
         
-        # Get line item descriptions for matching
-        line_item_descriptions = [item.description for item in line_items]
-        
-        # Match line items to product catalog
-        logger.info(f"Matching {len(line_item_descriptions)} line items to product catalog")
-        matching_results = match_line_items(line_item_descriptions)
-        
-        # Process matches
-        processed_items = []
-        
-        for item in line_items:
-            description = item.description
-            
-            # Get matching products for this line item
-            matches = matching_results.get(description, [])
-            logger.info(f"Found {len(matches)} matches for: {description}")
-            
-            # Add matches to database
-            for match_data in matches:
-                # Find or create product in catalog
-                product_desc = match_data["match"]
-                db_product = db.query(ProductCatalog).filter_by(description=product_desc).first()
-                
-                if not db_product:
-                    # Create new product in catalog if not exists
-                    logger.info(f"Creating new product in catalog: {product_desc}")
-                    db_product = ProductCatalog(description=product_desc)
-                    db.add(db_product)
-                    db.flush()
-                
-                # Create product match
-                db_match = ProductMatch(
-                    line_item_id=item.id,
-                    product_id=db_product.id,
-                    score=match_data["score"],
-                    is_selected=False  # Initially not selected
-                )
-                db.add(db_match)
-            
-            # Add line item to response
-            processed_item = {
-                "id": item.id,
-                "description": description,
-                "quantity": item.quantity,
-                "matches": [
-                    {
-                        "product_id": db.query(ProductCatalog).filter_by(description=m["match"]).first().id if db.query(ProductCatalog).filter_by(description=m["match"]).first() else None,
-                        "description": m["match"],
-                        "score": m["score"]
-                    }
-                    for m in matches
-                ]
-            }
-            processed_items.append(processed_item)
+        # Match in a worker thread, then store the matches
+        matching_results = await run_in_threadpool(match_line_items, [item.description for item in line_items])
+        processed_items = await db.run_sync(match_and_save_line_items, line_items, matching_results)
         
         # Commit all database changes
         logger.info("Committing all database changes")
-        db.commit()
+        await db.commit()
         
         logger.info(f"Document matching completed successfully: {db_document.id}")
         
@@ -317,7 +389,7 @@ async def match_document_items(
         }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error matching document items: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(
@@ -328,7 +400,7 @@ async def match_document_items(
 @router.post("/documents/{document_id}/process")
 async def process_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Process a previously uploaded PDF document.
@@ -357,12 +429,52 @@ async def process_document(
             detail=f"An error occurred during processing: {str(e)}"
         )
 
+@router.post("/documents/{document_id}/jobs", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
+def submit_document_job(
+    document_id: int,
+    request: JobSubmitRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Queue extraction and/or matching of a document in the background.
+    Returns the job immediately; poll GET /jobs/{job_id} for its progress.
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job kind: {request.kind}. Expected one of: {', '.join(JOB_KINDS)}"
+        )
+    
+    db_document = db.query(Document).filter(Document.id == document_id).first()
+    if db_document is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Document with ID {document_id} not found"
+        )
+    
+    return submit_job(db, document_id, request.kind)
+
+@router.get("/jobs/{job_id}", response_model=JobSchema)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Get the status, current stage and timings of a background job
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    
+    return job
+
 @router.get("/documents/{document_id}", response_model=DocumentSchema)
 def get_document(document_id: int, db: Session = Depends(get_db)):
     """
     Get document by ID with all its line items and matches
     """
-    db_document = db.query(Document).filter(Document.id == document_id).first()
+    db_document = get_document_with_matches(db, document_id)
     
     if db_document is None:
         raise HTTPException(
@@ -370,7 +482,12 @@ def get_document(document_id: int, db: Session = Depends(get_db)):
             detail=f"Document with ID {document_id} not found"
         )
     
-    return db_document
+    # The graph is fully loaded; serialize it once instead of validating it
+    # again against the response model
+    return Response(
+        content=DocumentSchema.model_validate(db_document, from_attributes=True).model_dump_json(),
+        media_type="application/json"
+    )
 
 @router.post("/matches/update")
 def update_match(request: UpdateMatchRequest, db: Session = Depends(get_db)):
@@ -416,54 +533,23 @@ def search_products(request: SearchProductRequest, db: Session = Depends(get_db)
     Search for products in the catalog based on a query string
     Returns the top N most similar products based on the limit parameter
     """
-    search_term = f"%{request.query}%"
-    limit = request.limit  # Get the limit for top matches
-    
-    # First, get products using a broader LIKE search
-    products = db.query(ProductCatalog).filter(
-        or_(
-            ProductCatalog.description.ilike(search_term),
-            ProductCatalog.type.ilike(search_term),
-            ProductCatalog.material.ilike(search_term),
-            ProductCatalog.size.ilike(search_term),
-            ProductCatalog.length.ilike(search_term)
-        )
-    ).all()
-    
-    # If no results or limited results, get more products to calculate similarity
-    if len(products) < limit * 2:
-        # Get more products to ensure we have enough candidates
-        additional_products = db.query(ProductCatalog).limit(50).all()
-        # Add only products not already in the list
-        product_ids = {p.id for p in products}
-        for product in additional_products:
-            if product.id not in product_ids:
-                products.append(product)
-                product_ids.add(product.id)
-    
-    # Calculate similarity scores
-    products_with_scores = []
-    preprocessed_query = preprocess_text(request.query)
-    
-    for product in products:
-        # Calculate similarity between query and product description
-        score = calculate_similarity(preprocessed_query, product.description)
-        products_with_scores.append((product, score))
-    
-    # Sort by similarity score in descending order
-    products_with_scores.sort(key=lambda x: x[1], reverse=True)
-    
-    # Return only the top N products
-    top_products = [product for product, _ in products_with_scores[:limit]]
-    
-    return top_products
+    return search_catalog(db, request.query, request.limit)
+
+@router.post("/products/search/batch", response_model=List[List[ProductCatalogSchema]])
+def search_products_batch(request: SearchProductBatchRequest, db: Session = Depends(get_db)):
+    """
+    Search for products for many queries in one request
+    Returns one list of products per query, in request order, ranked by
+    TF-IDF similarity like the matchers rather than like /products/search
+    """
+    return search_catalog_batch(db, [(query.query, query.limit) for query in request.queries])
 
 @router.post("/catalog/import")
 def import_catalog(db: Session = Depends(get_db)):
     """
     Import product catalog from CSV file
     """
-    csv_file_path = "onsite_documents/unique_fastener_catalog.csv"
+    csv_file_path = CATALOG_CSV_PATH
     
     try:
         # Check if file exists
@@ -473,35 +559,13 @@ def import_catalog(db: Session = Depends(get_db)):
                 detail=f"CSV file not found at {csv_file_path}"
             )
         
-        # Read CSV file and import products
-        with open(csv_file_path, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            
-            # Count rows for reporting
-            count = 0
-            
-            for row in reader:
-                # Check if product already exists
-                existing_product = db.query(ProductCatalog).filter_by(description=row.get('Description', '')).first()
-                
-                if not existing_product:
-                    # Create new product
-                    product = ProductCatalog(
-                        type=row.get('Type', ''),
-                        material=row.get('Material', ''),
-                        size=row.get('Size', ''),
-                        length=row.get('Length', ''),
-                        coating=row.get('Coating', ''),
-                        thread_type=row.get('Thread Type', ''),
-                        description=row.get('Description', '')
-                    )
-                    db.add(product)
-                    count += 1
-            
-            # Commit all additions
-            db.commit()
-            
-            return {"success": True, "imported": count}
+        # Stream the CSV into the catalog in batches (commits)
+        result = import_catalog_csv(db, csv_file_path)
+        
+        # Make the matcher pick up the new products
+        invalidate_catalog_index()
+        
+        return {"success": True, **result}
     
     except Exception as e:
         db.rollback()
@@ -517,6 +581,8 @@ def custom_match_items(request: dict):
     
     This is a bonus feature that shows a custom implementation of matching
     rather than using the external API.
+    
+    The optional "engine" field selects the scorer ("sequence" or "tfidf").
     """
     try:
         # Get queries from request
@@ -528,8 +594,8 @@ def custom_match_items(request: dict):
                 detail="No queries provided"
             )
         
-        # Use custom matching algorithm
-        results = match_line_items_custom(queries)
+        # Use custom matching algorithm, optionally with a specific engine
+        results = match_line_items_custom(queries, engine=request.get("engine"))
         
         return {
             "results": results
@@ -541,13 +607,63 @@ def custom_match_items(request: dict):
             detail=f"Error in custom matching: {str(e)}"
         )
 
-@router.get("/documents", response_model=List[DocumentSchema])
-def get_all_documents(db: Session = Depends(get_db)):
+@router.get("/documents", response_model=DocumentPageSchema)
+def get_all_documents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List uploaded documents newest first, one page at a time
+    Returns summary rows (line item and match counts); pass next_cursor as
+    cursor to get the next page. Full details come from /documents/{document_id}.
+    """
+    return list_document_summaries(db, limit=limit, cursor=cursor)
+
+@router.get("/extraction-cache/stats")
+def extraction_cache_stats():
+    """
+    Hit/miss counters of the PDF extraction cache
+    """
+    return get_cache_stats()
+
+@router.get("/blobs/{sha256}", response_model=BlobStatsSchema)
+def blob_stats(sha256: str, db: Session = Depends(get_db)):
+    """
+    Reference count and extraction cache hit rate of a stored PDF
+    """
+    stats = get_blob_stats(db, sha256)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return stats
+
+@router.delete("/extraction-cache")
+def clear_extraction_cache_entries():
     """
-    Get all uploaded documents with their line items and matches
+    Delete all cached extraction results so every document is re-extracted
     """
-    db_documents = db.query(Document).order_by(Document.upload_date.desc()).all()
-    return db_documents
+    deleted = clear_extraction_cache()
+    logger.info(f"Cleared {deleted} extraction cache entries")
+    return {"success": True, "deleted": deleted}
+
+@router.get("/profiles")
+def get_profiles(limit: int = Query(50, ge=1, le=500)):
+    """
+    List recent request profiles, newest first
+    Profiles are recorded with PROFILING_ENABLED for requests sent with the
+    X-Profile: 1 header or the profile=1 query parameter.
+    """
+    return list_profiles(limit=limit)
+
+@router.get("/profiles/{name}")
+def get_profile(name: str):
+    """
+    Download a request profile as folded stacks for a flame graph tool
+    """
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain")
 
 @router.get("/debug/status")
 def debug_status():
@@ -615,7 +731,7 @@ def debug_status():
     return status 
 
 @router.delete("/documents/{document_id}")
-async def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a document and all its associated data (line items, matches, and PDF file)
     """
@@ -623,7 +739,7 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
     
     try:
         # Get document from database
-        db_document = db.query(Document).filter(Document.id == document_id).first()
+        db_document = await db.get(Document, document_id)
         if db_document is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -631,21 +747,29 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
             )
         
         # Prepare the path to the PDF file
-        file_path = os.path.join(UPLOAD_DIR, f"document_{document_id}.pdf")
+        file_path = get_document_pdf_path(db_document)
+        sha256 = db_document.sha256
         
         # Delete document from database (cascades to line items and matches due to relationship settings)
-        db.delete(db_document)
-        db.commit()
+        await db.delete(db_document)
+        
+        # Drop the document's reference to its blob
+        last_reference = bool(sha256) and await db.run_sync(release_blob, sha256)
+        await db.commit()
+        
+        # The file of the last reference is only deleted once the commit succeeded
+        if last_reference:
+            await delete_blob_file(db, sha256)
         
-        # Delete the PDF file if it exists
-        if os.path.exists(file_path):
+        # Delete the PDF file of a document stored before the blob store
+        if not sha256 and os.path.exists(file_path):
             os.remove(file_path)
             logger.info(f"Deleted file: {file_path}")
         
         return {"success": True, "message": f"Document {document_id} deleted successfully"}
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error deleting document: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(
@@ -654,23 +778,28 @@ async def delete_document(document_id: int, db: Session = Depends(get_db)):
         )
 
 @router.get("/documents/{document_id}/pdf")
-async def get_document_pdf(document_id: int):
+async def get_document_pdf(document_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Serve the original PDF file for a given document
+    Conditional requests are answered with 304 and byte ranges with 206.
     """
-    file_path = os.path.join(UPLOAD_DIR, f"document_{document_id}.pdf")
+    db_document = await db.get(Document, document_id)
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    file_path = get_document_pdf_path(db_document)
     
     if not os.path.exists(file_path):
         logger.error(f"PDF file not found: {file_path}")
         raise HTTPException(status_code=404, detail="PDF file not found")
     
-    return FileResponse(file_path, media_type="application/pdf")
+    return serve_file(request, file_path, "application/pdf", content_hash=db_document.sha256)
 
 @router.post("/documents/{document_id}/export-excel")
 async def export_document_to_excel(
     document_id: int,
     table_data: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Generate an Excel file from the table data and document mappings
@@ -679,7 +808,7 @@ async def export_document_to_excel(
     
     try:
         # Verify document exists
-        document = db.query(Document).filter(Document.id == document_id).first()
+        document = await db.get(Document, document_id)
         if not document:
             logger.warning(f"Document not found: {document_id}")
             raise HTTPException(status_code=404, detail="Document not found")
@@ -1,7 +1,7 @@
 import os
 import sys
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
@@ -14,7 +14,17 @@ if current_dir not in sys.path:
 
 # Import application modules
 from app.api.routes import router as api_router
-from app.db.database import engine, Base
+from app.db.database import engine, Base, dispose_async_engine
+from app.services.catalog_index import get_catalog_index
+from app.services.tfidf_matcher import get_tfidf_matrix
+from app.services.matcher_pool import start_matcher_pool, shutdown_matcher_pool
+from app.services.extraction_cache import purge_stale_entries
+from app.services.pdf_extraction_service import PROMPT_VERSION
+from app.services.job_service import shutdown_job_executor
+from app.services.product_search import ensure_search_index
+from app.services.document_service import ensure_unique_product_matches
+from app.services.metrics import MetricsMiddleware, render_metrics
+from app.services.profiling import PROFILING_ENABLED, ProfilingMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -41,6 +51,13 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Request latency histograms for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Per-request profiles on demand (X-Profile: 1 or ?profile=1)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
@@ -54,6 +71,81 @@ app.include_router(api_router, prefix="/api")
 UPLOAD_DIR = os.path.join("app", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+@app.on_event("startup")
+def create_search_index():
+    """
+    Create the product search index (pg_trgm or SQLite FTS5) if it is missing
+    """
+    try:
+        ensure_search_index(engine)
+    except Exception as e:
+        logger.warning(f"Could not create product search index: {e}")
+
+@app.on_event("startup")
+def create_product_match_index():
+    """
+    Compact duplicate product matches and add their unique index if missing
+    """
+    try:
+        ensure_unique_product_matches(engine)
+    except Exception as e:
+        logger.warning(f"Could not create unique product match index: {e}")
+
+@app.on_event("startup")
+def load_catalog_index():
+    """
+    Build the resident product catalog index (and its TF-IDF matrix, used by
+    the tfidf matcher and the batch product search) before the first request
+    """
+    try:
+        get_tfidf_matrix(get_catalog_index())
+    except Exception as e:
+        logger.warning(f"Could not build catalog index at startup: {e}")
+
+@app.on_event("startup")
+def start_matcher_workers():
+    """
+    Start the matcher process pool (if MATCHER_WORKERS > 1) so every worker
+    has the catalog loaded before the first matching request
+    """
+    try:
+        start_matcher_pool()
+    except Exception as e:
+        logger.warning(f"Could not start matcher process pool: {e}")
+
+@app.on_event("startup")
+def purge_stale_extractions():
+    """
+    Drop cached extraction results written for a previous extraction prompt
+    """
+    try:
+        deleted = purge_stale_entries(PROMPT_VERSION)
+        if deleted:
+            logger.info(f"Purged {deleted} stale extraction cache entries")
+    except Exception as e:
+        logger.warning(f"Could not purge extraction cache: {e}")
+
+@app.on_event("shutdown")
+def stop_matcher_workers():
+    """
+    Stop the matcher process pool
+    """
+    shutdown_matcher_pool()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    """
+    Stop the background job pool
+    """
+    shutdown_job_executor()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    """
+    Close the connections of the async database engine
+    """
+    await dispose_async_engine()
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """
@@ -72,6 +164,13 @@ async def document_view(request: Request, document_id: int):
         "document_view.html", {"request": request, "title": "Document View", "document_id": document_id}
     )
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Request and processing stage metrics in the Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -13,7 +13,11 @@ class Document(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     upload_date = Column(DateTime, server_default=func.now())
+    sha256 = Column(String(64), index=True)  # hash of the stored PDF
+    file_size = Column(Integer)
+    table_data = Column(JSON)  # extracted table (title, columns, rows)
     items = relationship("LineItem", back_populates="document", cascade="all, delete-orphan")
+    jobs = relationship("Job", back_populates="document", cascade="all, delete-orphan")
 
 
 class LineItem(Base):
@@ -23,7 +27,7 @@ class LineItem(Base):
     __tablename__ = "line_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"))
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
     description = Column(Text, nullable=False)
     quantity = Column(Integer)
     document = relationship("Document", back_populates="items")
@@ -51,6 +55,10 @@ class ProductMatch(Base):
     ProductMatch model to store matches between line items and product catalog
     """
     __tablename__ = "product_matches"
+    # One row per line item and product; re-matching upserts into it
+    __table_args__ = (
+        Index("uq_product_matches_line_item_product", "line_item_id", "product_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     line_item_id = Column(Integer, ForeignKey("line_items.id"))
@@ -59,4 +67,56 @@ class ProductMatch(Base):
     is_selected = Column(Boolean, default=False)
     
     line_item = relationship("LineItem", back_populates="matches")
-    product = relationship("ProductCatalog") 
\ No newline at end of file
+    product = relationship("ProductCatalog")
+
+
+class Job(Base):
+    """
+    Job model to track background extraction/matching of a document
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    batch_id = Column(Integer, ForeignKey("batches.id"), index=True)  # set for batch uploads
+    kind = Column(String, nullable=False)  # extract, match or process
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed
+    stage = Column(String)  # current stage while running
+    error = Column(Text)
+    result = Column(JSON)
+    timings = Column(JSON)  # seconds spent queued and per stage
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    document = relationship("Document", back_populates="jobs")
+    batch = relationship("Batch", back_populates="jobs")
+
+
+class Batch(Base):
+    """
+    Batch model to group the processing jobs of a bulk upload
+    """
+    __tablename__ = "batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    rejected = Column(JSON)  # names of uploaded files that were not PDFs or could not be read
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime)
+
+    jobs = relationship("Job", back_populates="batch", order_by="Job.id")
+
+
+class Blob(Base):
+    """
+    Blob model to reference-count stored PDF files by content hash
+    """
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer)
+    ref_count = Column(Integer, nullable=False, default=0)  # documents using the file
+    extraction_cache_hits = Column(Integer, nullable=False, default=0)
+    extraction_cache_misses = Column(Integer, nullable=False, default=0)  # OpenAI extractions
+    created_at = Column(DateTime, server_default=func.now())
@@ -72,15 +72,30 @@ class DocumentCreate(DocumentBase):
 class Document(DocumentBase):
     id: int
     upload_date: datetime
+    table_data: Optional[Dict[str, Any]] = None
     items: List[LineItem] = []
 
     class Config:
         orm_mode = True
 
 
+class DocumentSummary(BaseModel):
+    id: int
+    filename: str
+    upload_date: Optional[datetime] = None
+    item_count: int
+    matched_count: int
+
+
+class DocumentPage(BaseModel):
+    documents: List[DocumentSummary]
+    next_cursor: Optional[int] = None
+
+
 class DocumentUploadResponse(BaseModel):
     document_id: int
     filename: str
+    sha256: Optional[str] = None
     items: List[Dict[str, Any]]
 
 
@@ -91,4 +106,59 @@ class UpdateMatchRequest(BaseModel):
 
 class SearchProductRequest(BaseModel):
     query: str
-    limit: int = 3  # Default to 3 matches 
\ No newline at end of file
+    limit: int = 3  # Default to 3 matches
+
+
+class SearchProductBatchRequest(BaseModel):
+    queries: List[SearchProductRequest]
+
+
+class Job(BaseModel):
+    id: int
+    document_id: int
+    kind: str
+    status: str
+    stage: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, float]] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class BatchDocument(BaseModel):
+    document_id: int
+    filename: str
+    sha256: Optional[str] = None
+    job_id: int
+    status: str
+    stage: Optional[str] = None
+    error: Optional[str] = None
+
+
+class Batch(BaseModel):
+    id: int
+    status: str
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    counts: Dict[str, int] = {}  # jobs per status
+    documents: List[BatchDocument]
+    rejected: List[str] = []  # uploaded files that are not PDFs
+
+
+class BlobStats(BaseModel):
+    sha256: str
+    size: Optional[int] = None
+    ref_count: int
+    extraction_cache_hits: int
+    extraction_cache_misses: int
+    hit_rate: float
+    created_at: Optional[datetime] = None
+
+
+class JobSubmitRequest(BaseModel):
+    kind: str = "process"  # extract, match or process
@@ -0,0 +1,150 @@
+"""
+Content-addressed storage of uploaded PDF files.
+
+Every PDF is stored once under its SHA-256 in a two-level fan-out tree
+(blobs/ab/cd/abcd....pdf), however many documents were uploaded with the same
+bytes. The blobs table counts the documents referencing each file, so the
+file is deleted with its last document, and records how often extractions of
+the blob were served from the extraction cache. The blob row is only deleted
+together with its file, in a transaction that holds the row until the file
+is gone, so an upload of the same bytes never references a deleted file.
+"""
+
+import os
+import logging
+from typing import Any, Dict, Optional
+
+import aiofiles.os
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db.database import dialect_insert
+from app.models.models import Blob
+from app.services.upload_service import move_upload_into_place, discard_upload
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Root of the blob tree
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join("app", "uploads", "blobs"))
+
+
+def blob_path(sha256: str) -> str:
+    """
+    Path of the stored PDF with the given SHA-256
+    """
+    return os.path.join(BLOB_STORE_DIR, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+
+def add_blob_reference(db: Session, sha256: str, size: int) -> None:
+    """
+    Add a document reference to a blob, creating its row for new content.
+    Call inside the transaction that adds the document: the locked blob row
+    keeps a concurrent release from dropping the blob
+    """
+    statement = dialect_insert(db, Blob).values(sha256=sha256, size=size, ref_count=1)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["sha256"],
+        set_={"ref_count": Blob.ref_count + 1}
+    ))
+
+
+async def store_blob(temp_path: str, sha256: str) -> bool:
+    """
+    Move a streamed upload into place as the file of its blob, unless the
+    blob file is already stored. Returns True if the temporary file was
+    moved, False if it is a duplicate and was left where it is
+    """
+    path = blob_path(sha256)
+    if await aiofiles.os.path.exists(path):
+        return False
+
+    await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+    await move_upload_into_place(temp_path, path)
+    return True
+
+
+async def settle_blob(temp_path: str, sha256: str) -> None:
+    """
+    Remove the temporary file of a deduplicated upload once its reference
+    has been committed
+    """
+    await discard_upload(temp_path)
+    logger.info(f"Deduplicated upload {sha256[:12]}")
+
+
+def release_blob(db: Session, sha256: str) -> bool:
+    """
+    Remove a document reference from a blob. Call inside the transaction that
+    deletes the document. Returns True if that was the last reference: once
+    the transaction has committed, the file can go with delete_blob_file
+    """
+    row = db.execute(
+        update(Blob)
+        .where(Blob.sha256 == sha256)
+        .values(ref_count=Blob.ref_count - 1)
+        .returning(Blob.ref_count)
+    ).first()
+    return row is not None and row.ref_count <= 0
+
+
+def drop_blob(db: Session, sha256: str) -> bool:
+    """
+    Delete the row of a released blob unless an upload of the same bytes has
+    referenced it again. The deleted row stays locked until the transaction
+    ends, so a concurrent add_blob_reference waits for the file to be removed
+    and then stores its own copy. Returns True if the file is to be removed
+    """
+    return db.execute(delete(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0)).rowcount > 0
+
+
+async def delete_blob_file(db: AsyncSession, sha256: str) -> bool:
+    """
+    Delete a released blob and its file in one transaction, after the
+    release was committed. Returns True if the file was deleted
+    """
+    if not await db.run_sync(drop_blob, sha256):
+        await db.rollback()
+        return False
+
+    try:
+        await aiofiles.os.remove(blob_path(sha256))
+    except FileNotFoundError:
+        pass
+    await db.commit()
+    logger.info(f"Deleted blob {sha256[:12]}")
+    return True
+
+
+def record_extraction(db: Session, sha256: str, source: str) -> None:
+    """
+    Count an extraction of a blob served from the extraction cache ("cache")
+    or by OpenAI ("openai"); local text-layer extractions are not counted
+    """
+    counters = {"cache": Blob.extraction_cache_hits, "openai": Blob.extraction_cache_misses}
+    if source not in counters:
+        return
+    column = counters[source]
+    db.execute(update(Blob).where(Blob.sha256 == sha256).values({column: column + 1}))
+
+
+def get_blob_stats(db: Session, sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    Reference count and extraction cache hit rate of a blob (None if unknown)
+    """
+    blob = db.get(Blob, sha256)
+    if blob is None:
+        return None
+
+    extractions = blob.extraction_cache_hits + blob.extraction_cache_misses
+    return {
+        "sha256": blob.sha256,
+        "size": blob.size,
+        "ref_count": blob.ref_count,
+        "extraction_cache_hits": blob.extraction_cache_hits,
+        "extraction_cache_misses": blob.extraction_cache_misses,
+        "hit_rate": blob.extraction_cache_hits / extractions if extractions else 0.0,
+        "created_at": blob.created_at,
+    }
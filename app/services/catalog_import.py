@@ -0,0 +1,150 @@
+"""
+Bulk import of the product catalog CSV.
+
+The CSV is streamed in batches instead of being checked row by row. On
+PostgreSQL each batch is COPY-ed into a temporary staging table and moved into
+product_catalog with INSERT ... ON CONFLICT (description) DO NOTHING; other
+databases (SQLite in development) use a batched executemany with the
+equivalent conflict handling.
+"""
+
+import io
+import os
+import csv
+import time
+import logging
+from itertools import islice
+from typing import Dict, Any, Iterator, List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.models.models import ProductCatalog
+from app.services.catalog_index import CATALOG_COLUMNS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of CSV rows sent to the database per batch
+CATALOG_IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", "10000"))
+
+STAGING_TABLE = "product_catalog_staging"
+
+
+def _read_batches(csv_file_path: str, batch_size: int) -> Iterator[List[Dict[str, str]]]:
+    """
+    Stream the catalog CSV as batches of product_catalog rows
+    """
+    with open(csv_file_path, "r", encoding="utf-8", newline="") as csvfile:
+        reader = csv.DictReader(csvfile)
+        rows = (
+            {column: row.get(csv_column) or "" for column, csv_column in CATALOG_COLUMNS.items()}
+            for row in reader
+        )
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def _import_postgresql(db: Session, batches: Iterator[List[Dict[str, str]]]) -> Dict[str, int]:
+    """
+    COPY each batch into a staging table, then insert the new products
+    """
+    columns = list(CATALOG_COLUMNS)
+    column_list = ", ".join(columns)
+
+    # Raw psycopg2 connection of the session's transaction, needed for COPY
+    cursor = db.connection().connection.cursor()
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+        f"(line_number bigint, {', '.join(f'{column} text' for column in columns)}) ON COMMIT DROP"
+    )
+
+    rows = 0
+    inserted = 0
+    for batch in batches:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line_number, row in enumerate(batch, start=rows):
+            writer.writerow([line_number] + [row[column] for column in columns])
+        buffer.seek(0)
+
+        cursor.copy_expert(f"COPY {STAGING_TABLE} (line_number, {column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        # Keep the CSV order for ids; duplicates inside the batch are skipped as conflicts too
+        cursor.execute(
+            f"INSERT INTO product_catalog ({column_list}) "
+            f"SELECT {column_list} FROM {STAGING_TABLE} WHERE description <> '' ORDER BY line_number "
+            f"ON CONFLICT (description) DO NOTHING"
+        )
+        inserted += cursor.rowcount
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        rows += len(batch)
+
+    cursor.close()
+    return {"rows": rows, "imported": inserted}
+
+
+def _import_batched(db: Session, batches: Iterator[List[Dict[str, str]]]) -> Dict[str, int]:
+    """
+    Insert each batch with one executemany, skipping existing descriptions
+    """
+    is_sqlite = db.get_bind().dialect.name == "sqlite"
+    count_products = select(func.count(ProductCatalog.id))
+    before = db.scalar(count_products)
+
+    rows = 0
+    for batch in batches:
+        rows += len(batch)
+        batch = [row for row in batch if row["description"]]
+        if not batch:
+            continue
+
+        if is_sqlite:
+            db.execute(sqlite_insert(ProductCatalog).on_conflict_do_nothing(index_elements=["description"]), batch)
+        else:
+            # Generic fallback: drop rows whose description already exists or repeats in the batch
+            existing = set(db.scalars(
+                select(ProductCatalog.description)
+                .where(ProductCatalog.description.in_([row["description"] for row in batch]))
+            ))
+            new_rows = []
+            for row in batch:
+                if row["description"] not in existing:
+                    existing.add(row["description"])
+                    new_rows.append(row)
+            if new_rows:
+                db.execute(insert(ProductCatalog), new_rows)
+
+    return {"rows": rows, "imported": db.scalar(count_products) - before}
+
+
+def import_catalog_csv(db: Session, csv_file_path: str, batch_size: int = CATALOG_IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Import products from a catalog CSV, skipping descriptions already in the catalog
+    Returns inserted/skipped counts and the import throughput (commits the session)
+    """
+    start_time = time.perf_counter()
+    batches = _read_batches(csv_file_path, batch_size)
+
+    if db.get_bind().dialect.name == "postgresql":
+        counts = _import_postgresql(db, batches)
+    else:
+        counts = _import_batched(db, batches)
+    db.commit()
+
+    seconds = time.perf_counter() - start_time
+    result = {
+        "imported": counts["imported"],
+        "skipped": counts["rows"] - counts["imported"],
+        "rows": counts["rows"],
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(counts["rows"] / seconds) if seconds > 0 else counts["rows"],
+    }
+    logger.info(
+        f"Imported {result['imported']} of {result['rows']} catalog rows "
+        f"in {result['seconds']} seconds ({result['rows_per_second']} rows/s)"
+    )
+    return result
@@ -0,0 +1,299 @@
+"""
+Resident product catalog index for the custom matcher.
+
+The catalog CSV is parsed and normalized once per process instead of on every
+matching request. The index is rebuilt and swapped in atomically whenever the
+CSV file or the product_catalog table changes.
+"""
+
+import csv
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Tuple, Any, Set, Pattern
+
+from sqlalchemy import text
+
+from app.services.metrics import STAGE_SECONDS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Path to the product catalog CSV
+CATALOG_CSV_PATH = os.getenv("CATALOG_CSV_PATH", "onsite_documents/unique_fastener_catalog.csv")
+
+# Minimum number of seconds between two staleness checks of the index
+CATALOG_INDEX_CHECK_INTERVAL = float(os.getenv("CATALOG_INDEX_CHECK_INTERVAL", "5"))
+
+# Mapping of product_catalog columns to CSV columns
+CATALOG_COLUMNS = {
+    "type": "Type",
+    "material": "Material",
+    "size": "Size",
+    "length": "Length",
+    "coating": "Coating",
+    "thread_type": "Thread Type",
+    "description": "Description",
+}
+
+# CSV columns used to block candidates before scoring
+ATTRIBUTE_COLUMNS = ["Type", "Material", "Size", "Length", "Coating", "Thread Type"]
+
+
+def load_product_catalog(csv_file_path: str) -> List[Dict[str, str]]:
+    """
+    Load product catalog from CSV file
+    """
+    catalog = []
+
+    try:
+        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                catalog.append(row)
+    except Exception as e:
+        print(f"Error loading catalog: {e}")
+        return []
+
+    return catalog
+
+
+def preprocess_text(text: str) -> str:
+    """
+    Preprocess text for better matching
+    - Convert to lowercase
+    - Remove special characters
+    - Remove extra spaces
+    """
+    # Convert to lowercase
+    text = text.lower()
+
+    # Remove special characters
+    text = re.sub(r'[^\w\s]', ' ', text)
+
+    # Remove extra spaces
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    return text
+
+
+class CatalogIndex:
+    """
+    Immutable snapshot of the product catalog.
+
+    Holds the structured CSV columns, the raw descriptions and their
+    preprocessed form side by side so scoring never has to normalize
+    catalog text again.
+    """
+
+    def __init__(self, products: List[Dict[str, Any]], version: Optional[Tuple] = None):
+        self.products = products
+        self.descriptions = [product.get("Description", "") or "" for product in products]
+        self.normalized = [preprocess_text(description) for description in self.descriptions]
+        self.product_ids = [product.get("id") for product in products]
+        self.version = version
+        self.built_at = time.time()
+        self.postings, self.attribute_patterns = self._build_postings(products)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    @staticmethod
+    def _build_postings(products: List[Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, List[int]]], List[Tuple[str, str, Pattern]]]:
+        """
+        Build per-attribute posting lists (normalized value -> row indices)
+        and the patterns used to spot those values in a line item
+        """
+        postings: Dict[str, Dict[str, List[int]]] = {column: {} for column in ATTRIBUTE_COLUMNS}
+        for row, product in enumerate(products):
+            for column in ATTRIBUTE_COLUMNS:
+                value = preprocess_text(product.get(column) or "")
+                if value:
+                    postings[column].setdefault(value, []).append(row)
+
+        patterns = []
+        for column, values in postings.items():
+            for value in values:
+                # Multi-word values can also be referred to by their first word
+                # ("stainless", "zinc") unless that word is a value of its own
+                words = value.split(" ")
+                aliases = [value]
+                if len(words) > 1 and words[0].isalpha() and words[0] not in values:
+                    aliases.append(words[0])
+                alternatives = "|".join(re.escape(alias) for alias in aliases)
+                patterns.append((column, value, re.compile(rf"\b(?:{alternatives})s?\b")))
+
+        # Longer values first so "stainless steel" wins over "steel"
+        patterns.sort(key=lambda item: len(item[1]), reverse=True)
+        return postings, patterns
+
+    def parse_attributes(self, query: str) -> Dict[str, Set[str]]:
+        """
+        Find catalog attribute values (type, material, size, ...) mentioned
+        in a preprocessed line item description
+        """
+        # "10 mm" is written "10mm" in the catalog
+        query = re.sub(r"\b(\d+) mm\b", r"\1mm", query)
+
+        found: Dict[str, Set[str]] = {}
+        for column, value, pattern in self.attribute_patterns:
+            match = pattern.search(query)
+            if not match:
+                continue
+            # Blank out the match so shorter values cannot reuse the same words
+            query = query[:match.start()] + " " * (match.end() - match.start()) + query[match.end():]
+            found.setdefault(column, set()).add(value)
+        return found
+
+    def candidate_indices(self, query: str, min_candidates: int = 1) -> Optional[List[int]]:
+        """
+        Return the sorted row indices of the products sharing the most
+        attributes parsed from a preprocessed description, adding the rows
+        that share one attribute less until there are min_candidates, or
+        None if nothing could be parsed
+        """
+        attributes = self.parse_attributes(query)
+        if not attributes:
+            return None
+
+        # Count the parsed attributes each product shares; several values of
+        # one attribute are OR-ed
+        shared: Counter = Counter()
+        for column, values in attributes.items():
+            rows: Set[int] = set()
+            for value in values:
+                rows.update(self.postings[column][value])
+            shared.update(rows)
+
+        rows_by_shared: Dict[int, List[int]] = {}
+        for row, count in shared.items():
+            rows_by_shared.setdefault(count, []).append(row)
+
+        # Products differing in a single attribute are the close alternatives,
+        # so relax the attributes one at a time instead of intersecting them all
+        candidates: List[int] = []
+        for count in sorted(rows_by_shared, reverse=True):
+            candidates.extend(rows_by_shared[count])
+            if len(candidates) >= min_candidates:
+                break
+
+        return sorted(candidates)
+
+
+def _csv_signature(csv_file_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Return (mtime, size) of the catalog CSV, or None if it does not exist
+    """
+    try:
+        stat = os.stat(csv_file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _catalog_table_signature() -> Optional[Tuple[int, int]]:
+    """
+    Return (row count, max id) of the product_catalog table, or None if the
+    database is not reachable
+    """
+    try:
+        from app.db.database import engine
+        with engine.connect() as connection:
+            row = connection.execute(text("SELECT count(id), max(id) FROM product_catalog")).first()
+        return (row[0] or 0, row[1] or 0)
+    except Exception as e:
+        logger.debug(f"Product catalog table not available: {e}")
+        return None
+
+
+def _load_catalog_table() -> List[Dict[str, Any]]:
+    """
+    Load all products of the product_catalog table as CSV-style rows
+    """
+    from app.db.database import engine
+    columns = ", ".join(["id"] + list(CATALOG_COLUMNS))
+    with engine.connect() as connection:
+        result = connection.execute(text(f"SELECT {columns} FROM product_catalog ORDER BY id"))
+        rows = []
+        for record in result.mappings():
+            row = {csv_column: record[column] or "" for column, csv_column in CATALOG_COLUMNS.items()}
+            row["id"] = record["id"]
+            rows.append(row)
+    return rows
+
+
+@STAGE_SECONDS.time(stage="catalog_load")
+def build_catalog_index(csv_file_path: str = CATALOG_CSV_PATH, version: Optional[Tuple] = None) -> CatalogIndex:
+    """
+    Build a catalog index from the CSV file merged with the product_catalog table.
+
+    CSV rows keep their order; database ids are attached by description, and
+    products that only exist in the database are appended at the end.
+    """
+    start_time = time.time()
+
+    products = load_product_catalog(csv_file_path) if os.path.exists(csv_file_path) else []
+
+    # The table signature is part of the version; only read the table if it is reachable
+    if version is None or version[-1] is not None:
+        try:
+            db_products = _load_catalog_table()
+        except Exception as e:
+            logger.warning(f"Could not load product_catalog table, using CSV only: {e}")
+            db_products = []
+
+        by_description = {product.get("Description", ""): product for product in products}
+        for db_product in db_products:
+            existing = by_description.get(db_product["Description"])
+            if existing is not None:
+                existing["id"] = db_product["id"]
+            else:
+                products.append(db_product)
+                by_description[db_product["Description"]] = db_product
+
+    index = CatalogIndex(products, version=version)
+    logger.info(f"Built catalog index with {len(index)} products in {time.time() - start_time:.2f} seconds")
+    return index
+
+
+_index: Optional[CatalogIndex] = None
+_index_lock = threading.Lock()
+_last_check = 0.0
+
+
+def get_catalog_index(csv_file_path: str = CATALOG_CSV_PATH, force: bool = False) -> CatalogIndex:
+    """
+    Return the process-wide catalog index, rebuilding it if the CSV file or
+    the product_catalog table changed since it was built
+    """
+    global _index, _last_check
+
+    index = _index
+    if (
+        index is not None
+        and not force
+        and index.version[0] == csv_file_path
+        and time.monotonic() - _last_check < CATALOG_INDEX_CHECK_INTERVAL
+    ):
+        return index
+
+    with _index_lock:
+        version = (csv_file_path, _csv_signature(csv_file_path), _catalog_table_signature())
+        _last_check = time.monotonic()
+
+        if force or _index is None or _index.version != version:
+            # Readers keep using the old snapshot until the new one is assigned
+            _index = build_catalog_index(csv_file_path, version)
+
+        return _index
+
+
+def invalidate_catalog_index() -> None:
+    """
+    Force the next get_catalog_index call to re-check the catalog sources
+    """
+    global _last_check
+    _last_check = 0.0
@@ -4,46 +4,29 @@ Custom matching implementation for document line items to product catalog.
 This is a simple implementation that could replace the external API for matching.
 """
 
-import csv
-import re
-from typing import List, Dict, Any
 import os
+import heapq
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
 from difflib import SequenceMatcher
 
-def load_product_catalog(csv_file_path: str) -> List[Dict[str, str]]:
-    """
-    Load product catalog from CSV file
-    """
-    catalog = []
-    
-    try:
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                catalog.append(row)
-    except Exception as e:
-        print(f"Error loading catalog: {e}")
-        return []
-    
-    return catalog
+from app.services.catalog_index import (
+    CatalogIndex,
+    get_catalog_index,
+    load_product_catalog,
+    preprocess_text,
+)
+from app.services.tfidf_matcher import match_line_items_tfidf
+from app.services.matcher_pool import MATCHER_WORKERS, match_line_items_sharded
 
-def preprocess_text(text: str) -> str:
-    """
-    Preprocess text for better matching
-    - Convert to lowercase
-    - Remove special characters
-    - Remove extra spaces
-    """
-    # Convert to lowercase
-    text = text.lower()
-    
-    # Remove special characters
-    text = re.sub(r'[^\w\s]', ' ', text)
-    
-    # Remove extra spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+# Available scoring engines: "sequence" (difflib.SequenceMatcher) or "tfidf"
+# (char-trigram TF-IDF cosine similarity)
+MATCHER_ENGINES = ("sequence", "tfidf")
+MATCHER_ENGINE = os.getenv("MATCHER_ENGINE", "sequence")
+
+# Minimum number of products scored per description with blocking, so the
+# alternatives below the best match are the same as with a full scan
+BLOCKING_MIN_CANDIDATES = int(os.getenv("BLOCKING_MIN_CANDIDATES", "100"))
 
 def calculate_similarity(text1: str, text2: str) -> float:
     """
@@ -54,27 +37,138 @@ def calculate_similarity(text1: str, text2: str) -> float:
     text1 = preprocess_text(text1)
     text2 = preprocess_text(text2)
     
+    return _normalized_similarity(text1, text2)
+
+def _normalized_similarity(text1: str, text2: str) -> float:
+    """
+    Calculate similarity score between two already preprocessed strings
+    """
     # Use SequenceMatcher to calculate similarity
     matcher = SequenceMatcher(None, text1, text2)
     similarity = matcher.ratio() * 100
     
     return similarity
 
-def match_line_items_custom(descriptions: List[str], top_n: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+def score_description(
+    index: CatalogIndex,
+    description: str,
+    top_n: int = 5,
+    blocking: bool = True,
+    shard: Optional[Tuple[int, int]] = None
+) -> List[Tuple[float, int]]:
+    """
+    Score one description against the catalog with SequenceMatcher
+    Returns the top N (score, row) pairs, best first, ties in catalog order
+    
+    Only a bounded heap of the N best candidates is kept, and the cheap
+    real_quick_ratio()/quick_ratio() upper bounds skip the full ratio()
+    for candidates that cannot beat the current N-th best score.
+    
+    shard=(shard_id, n_shards) restricts scoring to every n-th candidate so
+    the work can be split across processes and merged afterwards.
+    """
+    # Catalog descriptions are already preprocessed in the index
+    query = preprocess_text(description)
+    
+    # Restrict scoring to compatible products when attributes can be parsed
+    candidates = index.candidate_indices(query, min_candidates=max(top_n, BLOCKING_MIN_CANDIDATES)) if blocking else None
+    if candidates is None:
+        candidates = range(len(index))
+    
+    if shard is not None:
+        shard_id, n_shards = shard
+        candidates = candidates[shard_id::n_shards]
+    
+    if top_n <= 0:
+        return []
+    
+    # Bounded min-heap of (ratio, -row): heap[0] is the current N-th best,
+    # the lowest ratio and, among equal ratios, the latest catalog row
+    heap: List[Tuple[float, int]] = []
+    matcher = SequenceMatcher(None, query, "")
+    query_counts = Counter(query)
+    query_length = len(query)
+    
+    for row in candidates:
+        product_text = index.normalized[row]
+        
+        if len(heap) == top_n:
+            # Candidates come in catalog order, so a later row only enters the
+            # heap by strictly beating the N-th best ratio. Skip the full ratio()
+            # when even its upper bounds cannot do that.
+            threshold = heap[0][0]
+            total = query_length + len(product_text)
+            if not total or 2.0 * min(query_length, len(product_text)) / total <= threshold:
+                continue  # real_quick_ratio() bound
+            if _quick_ratio(query_counts, product_text, total) <= threshold:
+                continue  # quick_ratio() bound
+        
+        matcher.set_seq2(product_text)
+        ratio = matcher.ratio()
+        
+        if len(heap) < top_n:
+            heapq.heappush(heap, (ratio, -row))
+        elif ratio > heap[0][0]:
+            heapq.heapreplace(heap, (ratio, -row))
+    
+    # Best score first, ties in catalog order
+    heap.sort(key=lambda entry: (-entry[0], -entry[1]))
+    return [(ratio * 100, -negative_row) for ratio, negative_row in heap]
+
+def _quick_ratio(query_counts: Counter, text: str, total: int) -> float:
+    """
+    Upper bound on SequenceMatcher.ratio(), same as quick_ratio(): the
+    character multiset intersection of the two strings
+    """
+    available = dict(query_counts)
+    matches = 0
+    for char in text:
+        if available.get(char, 0) > 0:
+            available[char] -= 1
+            matches += 1
+    return 2.0 * matches / total
+
+def match_line_items_custom(
+    descriptions: List[str],
+    top_n: int = 5,
+    catalog_index: Optional[CatalogIndex] = None,
+    blocking: bool = True,
+    engine: Optional[str] = None,
+    workers: Optional[int] = None
+) -> Dict[str, List[Dict[str, Any]]]:
     """
     Match line item descriptions to products in catalog
     Returns top N matches for each description
+    
+    With blocking enabled only products sharing the attributes parsed from
+    the description (type, material, size, ...), or all but one of them, are
+    scored (at least BLOCKING_MIN_CANDIDATES); descriptions without any
+    recognizable attribute are scored against the full catalog.
+    
+    The engine defaults to MATCHER_ENGINE; "tfidf" scores the whole batch
+    with one sparse matrix multiply over the full catalog.
+    
+    With more than one worker (default MATCHER_WORKERS) the work is sharded
+    across the persistent matcher process pool.
     """
-    # Path to product catalog
-    csv_file_path = "onsite_documents/unique_fastener_catalog.csv"
+    engine = engine or MATCHER_ENGINE
+    if engine not in MATCHER_ENGINES:
+        raise ValueError(f"Unknown matcher engine: {engine}")
     
-    # Check if file exists
-    if not os.path.exists(csv_file_path):
-        print(f"CSV file not found at {csv_file_path}")
-        return {}
+    workers = MATCHER_WORKERS if workers is None else workers
+    if workers > 1 and catalog_index is None:
+        return match_line_items_sharded(descriptions, top_n=top_n, blocking=blocking, engine=engine)
+    
+    # Use the resident catalog index unless one is given explicitly
+    index = catalog_index if catalog_index is not None else get_catalog_index()
     
-    # Load product catalog
-    catalog = load_product_catalog(csv_file_path)
+    if engine == "tfidf":
+        return match_line_items_tfidf(descriptions, top_n=top_n, catalog_index=index)
+    
+    # Check if the catalog has any products
+    if not len(index):
+        print("Product catalog is empty or CSV file not found")
+        return {}
     
     # Dictionary to store results
     results = {}
@@ -85,22 +179,9 @@ def match_line_items_custom(descriptions: List[str], top_n: int = 5) -> Dict[str
         if not description:
             continue
         
-        # Calculate similarity scores for all products
-        matches = []
-        
-        for product in catalog:
-            product_desc = product.get('Description', '')
-            score = calculate_similarity(description, product_desc)
-            
-            matches.append({
-                "match": product_desc,
-                "score": score
-            })
-        
-        # Sort by score in descending order
-        matches.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Take top N matches
-        results[description] = matches[:top_n]
+        results[description] = [
+            {"match": index.descriptions[row], "score": score}
+            for score, row in score_description(index, description, top_n=top_n, blocking=blocking)
+        ]
     
-    return results 
\ No newline at end of file
+    return results
@@ -1,37 +1,100 @@
 import os
 import json
+import logging
 import requests
-from typing import List, Dict, Any, BinaryIO
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
 from dotenv import load_dotenv
+from sqlalchemy import delete, distinct, func, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, selectinload
+
+from app.db.database import dialect_insert
+from app.models.models import Document, LineItem, ProductCatalog, ProductMatch
 
 # Import our new OpenAI PDF extraction service
-from app.services.pdf_extraction_service import extract_document_content_with_llm
+from app.services.pdf_extraction_service import extract_document_content_with_source, extract_document_content_with_source_async
+# Content-addressed PDF storage
+from app.services.blob_store import blob_path
+from app.services.metrics import STAGE_SECONDS
 # Import the custom matcher
 from app.services.custom_matcher import match_line_items_custom
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 EXTRACTION_API_URL = os.getenv("EXTRACTION_API_URL")
 MATCHING_API_URL = os.getenv("MATCHING_API_URL")
 
+# Directory of documents uploaded before the blob store
+UPLOAD_DIR = os.path.join("app", "uploads")
+
+# Unique index that makes re-matching an upsert
+PRODUCT_MATCH_UNIQUE_INDEX = "uq_product_matches_line_item_product"
+
+
+def get_document_pdf_path(document: Document) -> str:
+    """
+    Path of the stored PDF of a document: its blob, or the per-document file
+    of documents uploaded before content-addressed storage
+    """
+    if document.sha256:
+        return blob_path(document.sha256)
+    return os.path.join(UPLOAD_DIR, f"document_{document.id}.pdf")
+
+
+def get_document_with_matches(db: Session, document_id: int) -> Optional[Document]:
+    """
+    Load a document with its line items, their matches and the matched
+    products in four queries, however many line items there are
+    """
+    statement = (
+        select(Document)
+        .where(Document.id == document_id)
+        .options(selectinload(Document.items).selectinload(LineItem.matches).selectinload(ProductMatch.product))
+    )
+    return db.scalars(statement).first()
+
 
-def extract_document_content(file: BinaryIO) -> List[Dict[str, Any]]:
+def extract_document_content(file: BinaryIO, pdf_hash: Optional[str] = None) -> Tuple[List[Dict[str, Any]], str]:
     """
     Extract content from PDF document using OpenAI instead of external API
+    Returns the items and their source ("local", "cache", "openai" or "error")
     """
     try:
         # Use our OpenAI-based extraction service
-        return extract_document_content_with_llm(file)
+        return extract_document_content_with_source(file, pdf_hash)
+    except Exception as e:
+        print(f"Error extracting document content with OpenAI: {str(e)}")
+        return [{
+            "description": f"Error extracting content: {str(e)}",
+            "quantity": 1,
+            "error": str(e)
+        }], "error"
+
+
+async def extract_document_content_async(
+    file_content: bytes,
+    pdf_hash: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Extract content from PDF bytes without blocking the event loop
+    Returns the items and their source like extract_document_content
+    """
+    try:
+        return await extract_document_content_with_source_async(file_content, pdf_hash)
     except Exception as e:
         print(f"Error extracting document content with OpenAI: {str(e)}")
         return [{
             "description": f"Error extracting content: {str(e)}",
             "quantity": 1,
             "error": str(e)
-        }]
+        }], "error"
 
 
+@STAGE_SECONDS.time(stage="candidate_scoring")
 def match_line_items(descriptions: List[str]) -> Dict[str, List[Dict[str, Any]]]:
     """
     Match line item descriptions to products in catalog using custom matching
@@ -42,4 +105,253 @@ def match_line_items(descriptions: List[str]) -> Dict[str, List[Dict[str, Any]]]
         return matching_results
     except Exception as e:
         print(f"Error in matching: {str(e)}")
-        return {} 
\ No newline at end of file
+        return {}
+
+
+@STAGE_SECONDS.time(stage="line_item_persistence")
+def save_extracted_items(db: Session, document: Document, extracted_content: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Store extracted line items and the extracted table of a document (without committing)
+    Returns the items for the API response, TABLE_STRUCTURE item first
+    """
+    # Process results and save to database
+    extracted_items = []
+    
+    # Check if the first item is a table structure item
+    table_data = None
+    if extracted_content and extracted_content[0].get("description") == "TABLE_STRUCTURE" and "table_data" in extracted_content[0]:
+        table_data = extracted_content[0]["table_data"]
+    
+    # Keep the table on the document so viewing it never re-runs extraction
+    document.table_data = table_data
+    
+    # If we have table data, add it to the response
+    if table_data:
+        extracted_items.append({
+            "description": "TABLE_STRUCTURE",
+            "quantity": 1,
+            "table_data": table_data
+        })
+    
+    # Collect the line items to insert
+    rows = []
+    for item in extracted_content:
+        # Skip the table structure item when saving individual items
+        if item.get("description") == "TABLE_STRUCTURE":
+            continue
+        
+        if "description" not in item:
+            logger.warning(f"Skipping item without description: {item}")
+            continue
+        
+        rows.append({
+            "document_id": document.id,
+            "description": item["description"],
+            "quantity": item.get("quantity", 1)
+        })
+    
+    if not rows:
+        return extracted_items
+    
+    # Insert all line items in one batched statement; ids come back in row order
+    logger.info(f"Creating {len(rows)} line items")
+    line_item_ids = db.scalars(
+        insert(LineItem).returning(LineItem.id, sort_by_parameter_order=True),
+        rows
+    ).all()
+    
+    # Add line items to response
+    for line_item_id, row in zip(line_item_ids, rows):
+        extracted_items.append({
+            "id": line_item_id,
+            "description": row["description"],
+            "quantity": row["quantity"],
+            "matches": []  # No matches yet
+        })
+    
+    return extracted_items
+
+
+def match_and_save_line_items(
+    db: Session,
+    line_items: List[LineItem],
+    matching_results: Optional[Dict[str, List[Dict[str, Any]]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Match line items to the product catalog and store the matches (without committing)
+    Pass matching_results to store matches computed elsewhere (e.g. in a worker thread)
+    Returns the items with their matches for the API response
+    """
+    if matching_results is None:
+        # Get line item descriptions for matching
+        line_item_descriptions = [item.description for item in line_items]
+        
+        # Match line items to product catalog
+        logger.info(f"Matching {len(line_item_descriptions)} line items to product catalog")
+        matching_results = match_line_items(line_item_descriptions)
+    
+    with STAGE_SECONDS.time(stage="match_persistence"):
+        return _save_matches(db, line_items, matching_results)
+
+
+def _save_matches(
+    db: Session,
+    line_items: List[LineItem],
+    matching_results: Dict[str, List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """
+    Store the matches of line items found by the matcher (without committing)
+    """
+    # Resolve all matched descriptions to product ids with a single IN query
+    matched_descriptions = list(dict.fromkeys(
+        match_data["match"]
+        for item in line_items
+        for match_data in matching_results.get(item.description, [])
+    ))
+    product_ids = {}
+    if matched_descriptions:
+        product_ids = dict(
+            db.query(ProductCatalog.description, ProductCatalog.id)
+            .filter(ProductCatalog.description.in_(matched_descriptions))
+            .all()
+        )
+    
+    # Create products missing from the catalog in one statement
+    missing_descriptions = [description for description in matched_descriptions if description not in product_ids]
+    if missing_descriptions:
+        logger.info(f"Creating {len(missing_descriptions)} new products in catalog")
+        created = db.execute(
+            insert(ProductCatalog).returning(ProductCatalog.description, ProductCatalog.id),
+            [{"description": description} for description in missing_descriptions]
+        ).all()
+        product_ids.update(dict(created))
+    
+    # Process matches
+    processed_items = []
+    match_rows = []
+    
+    for item in line_items:
+        description = item.description
+        
+        # Get matching products for this line item (best first, once per product)
+        matches = []
+        matched_products = set()
+        for match_data in matching_results.get(description, []):
+            if product_ids[match_data["match"]] not in matched_products:
+                matched_products.add(product_ids[match_data["match"]])
+                matches.append(match_data)
+        logger.info(f"Found {len(matches)} matches for: {description}")
+        
+        for match_data in matches:
+            match_rows.append({
+                "line_item_id": item.id,
+                "product_id": product_ids[match_data["match"]],
+                "score": match_data["score"],
+                "is_selected": False  # Initially not selected
+            })
+        
+        # Add line item to response
+        processed_item = {
+            "id": item.id,
+            "description": description,
+            "quantity": item.quantity,
+            "matches": [
+                {
+                    "product_id": product_ids[m["match"]],
+                    "description": m["match"],
+                    "score": m["score"]
+                }
+                for m in matches
+            ]
+        }
+        processed_items.append(processed_item)
+    
+    # Replace the previous matches: unselected ones are dropped, the user's
+    # selection is kept and only gets its score refreshed by the upsert
+    if line_items:
+        db.execute(
+            delete(ProductMatch)
+            .where(ProductMatch.line_item_id.in_([item.id for item in line_items]))
+            .where(ProductMatch.is_selected.isnot(True))
+        )
+    
+    # Add all matches to database in one batched upsert
+    if match_rows:
+        statement = dialect_insert(db, ProductMatch)
+        statement = statement.on_conflict_do_update(
+            index_elements=["line_item_id", "product_id"],
+            set_={"score": statement.excluded.score}
+        )
+        db.execute(statement, match_rows)
+    
+    return processed_items
+
+
+def ensure_unique_product_matches(engine: Engine) -> int:
+    """
+    Create the unique (line_item_id, product_id) index on databases created
+    before it existed, first removing the duplicate matches left by repeated
+    matching (the selected or best-scored row is kept)
+    Returns the number of deleted rows
+    """
+    indexes = {index["name"] for index in inspect(engine).get_indexes("product_matches")}
+    if PRODUCT_MATCH_UNIQUE_INDEX in indexes:
+        return 0
+    
+    with engine.begin() as connection:
+        deleted = connection.execute(text("""
+            DELETE FROM product_matches WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY line_item_id, product_id
+                        ORDER BY CASE WHEN is_selected THEN 1 ELSE 0 END DESC, COALESCE(score, -1) DESC, id
+                    ) AS position
+                    FROM product_matches
+                ) ranked
+                WHERE position > 1
+            )
+        """)).rowcount
+        connection.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {PRODUCT_MATCH_UNIQUE_INDEX} "
+            f"ON product_matches (line_item_id, product_id)"
+        ))
+    
+    logger.info(f"Removed {deleted} duplicate product matches and created {PRODUCT_MATCH_UNIQUE_INDEX}")
+    return deleted
+
+
+def list_document_summaries(db: Session, limit: int = 50, cursor: Optional[int] = None) -> Dict[str, Any]:
+    """
+    List documents newest first as summary rows, one page at a time
+    Pages are keyed on the document id (ids grow with the upload date), so a
+    page costs the same wherever it is in the listing. The line item and
+    match counts come from correlated subqueries in the same statement.
+    """
+    item_count = (
+        select(func.count(LineItem.id))
+        .where(LineItem.document_id == Document.id, LineItem.description != "TABLE_STRUCTURE")
+        .correlate(Document)
+        .scalar_subquery()
+    )
+    matched_count = (
+        select(func.count(distinct(ProductMatch.line_item_id)))
+        .join(LineItem, LineItem.id == ProductMatch.line_item_id)
+        .where(LineItem.document_id == Document.id)
+        .correlate(Document)
+        .scalar_subquery()
+    )
+
+    statement = select(
+        Document.id,
+        Document.filename,
+        Document.upload_date,
+        item_count.label("item_count"),
+        matched_count.label("matched_count")
+    ).order_by(Document.id.desc()).limit(limit + 1)
+    if cursor is not None:
+        statement = statement.where(Document.id < cursor)
+
+    rows = db.execute(statement).mappings().all()
+    documents = [dict(row) for row in rows[:limit]]
+    next_cursor = documents[-1]["id"] if len(rows) > limit else None
+    return {"documents": documents, "next_cursor": next_cursor}
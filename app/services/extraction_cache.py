@@ -0,0 +1,154 @@
+"""
+Persistent cache for PDF extraction results.
+
+Results are stored as JSON files keyed by the SHA-256 of the PDF bytes, the
+model name and the prompt version, so byte-identical documents are only sent
+to OpenAI once per model and prompt. Entries written for another prompt
+version never match and can be purged with purge_stale_entries.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional
+
+from app.services.metrics import EXTRACTION_CACHE_EVENTS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Directory holding the cached extraction results
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join("app", "cache", "extractions"))
+
+# Set to "0" to disable the cache
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "1") != "0"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+
+
+def content_hash(content: bytes) -> str:
+    """
+    Return the SHA-256 hex digest of the PDF bytes
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+def _entry_path(pdf_hash: str, model: str, prompt_version: str) -> str:
+    """
+    Path of a cache entry; entries are fanned out by the first hash byte
+    """
+    safe_model = "".join(char if char.isalnum() or char in ".-" else "_" for char in model)
+    return os.path.join(EXTRACTION_CACHE_DIR, pdf_hash[:2], f"{pdf_hash}_{safe_model}_{prompt_version}.json")
+
+
+def _count(counter: str) -> None:
+    with _stats_lock:
+        _stats[counter] += 1
+    EXTRACTION_CACHE_EVENTS.inc(event=counter)
+
+
+def get_cached_extraction(pdf_hash: str, model: str, prompt_version: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Return the cached extracted items for a PDF, or None on a cache miss
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+
+    path = _entry_path(pdf_hash, model, prompt_version)
+    try:
+        with open(path, "r", encoding="utf-8") as cache_file:
+            entry = json.load(cache_file)
+    except FileNotFoundError:
+        _count("misses")
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable extraction cache entry {path}: {e}")
+        _count("misses")
+        return None
+
+    _count("hits")
+    logger.info(f"Extraction cache hit for {pdf_hash[:12]}")
+    return entry["items"]
+
+
+def store_extraction(pdf_hash: str, model: str, prompt_version: str, items: List[Dict[str, Any]]) -> bool:
+    """
+    Store extracted items for a PDF. Only successful extractions (starting
+    with a TABLE_STRUCTURE item parsed from JSON) are cached, so errors and
+    unparseable model output are retried.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return False
+    if not items or items[0].get("description") != "TABLE_STRUCTURE" or items[0].get("fallback"):
+        return False
+
+    path = _entry_path(pdf_hash, model, prompt_version)
+    entry = {
+        "sha256": pdf_hash,
+        "model": model,
+        "prompt_version": prompt_version,
+        "created_at": time.time(),
+        "items": items,
+    }
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".tmp", delete=False, encoding="utf-8") as temp_file:
+            json.dump(entry, temp_file)
+        os.replace(temp_file.name, path)
+    except Exception as e:
+        logger.warning(f"Failed to store extraction cache entry {path}: {e}")
+        return False
+
+    _count("stores")
+    return True
+
+
+def purge_stale_entries(prompt_version: str) -> int:
+    """
+    Delete cache entries written for any other prompt version
+    Returns the number of deleted entries
+    """
+    return _delete_entries(lambda filename: not filename.endswith(f"_{prompt_version}.json"))
+
+
+def clear_extraction_cache() -> int:
+    """
+    Delete all cache entries
+    Returns the number of deleted entries
+    """
+    return _delete_entries(lambda filename: True)
+
+
+def _delete_entries(should_delete) -> int:
+    deleted = 0
+    if not os.path.isdir(EXTRACTION_CACHE_DIR):
+        return deleted
+
+    for directory, _, filenames in os.walk(EXTRACTION_CACHE_DIR):
+        for filename in filenames:
+            if filename.endswith(".json") and should_delete(filename):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                    deleted += 1
+                except OSError as e:
+                    logger.warning(f"Failed to delete extraction cache entry {filename}: {e}")
+    return deleted
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Return hit/miss counters of this process and the hit rate
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["enabled"] = EXTRACTION_CACHE_ENABLED
+    return stats
@@ -0,0 +1,155 @@
+"""
+HTTP delivery of stored PDF files with validators and partial content.
+
+Responses carry a strong ETag (the content hash where there is one) and
+Last-Modified, so repeat views become 304 Not Modified, and single byte
+ranges are answered with 206 Partial Content for viewers that fetch pages
+on demand. Files stored by content hash never change under the same
+document, so they are sent with a long-lived immutable Cache-Control.
+"""
+
+import os
+import hashlib
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Browser cache lifetime in seconds of content-addressed files
+PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Partial responses are read and sent in chunks of this many bytes
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header lists the ETag (weak comparison)
+    """
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    """
+    Whether a file last modified at mtime is unchanged since an HTTP date
+    """
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive offsets
+    Returns None for a header that is not a single valid byte range (the
+    whole file is sent) and raises ValueError for a range that starts at or
+    past the end of the file
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_text, dash, end_text = ranges.strip().partition("-")
+    if not dash:
+        return None
+
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else max(start, size - 1)
+            if start < 0 or end < start:
+                return None
+        else:
+            # Suffix range: the last N bytes (none for N = 0)
+            length = int(end_text)
+            if length < 0:
+                return None
+            start = max(size - length, 0) if length else size
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Read the inclusive byte range of a file in chunks
+    """
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as file:
+        await file.seek(start)
+        while remaining > 0:
+            chunk = await file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(
+    request: Request,
+    path: str,
+    media_type: str,
+    content_hash: Optional[str] = None
+) -> Response:
+    """
+    Serve a file honouring If-None-Match, If-Modified-Since, Range and If-Range
+    content_hash is used as the ETag and marks the file as immutable; files
+    without one get an ETag from their size and mtime and are revalidated
+    """
+    stat = os.stat(path)
+    if content_hash:
+        etag = f'"{content_hash}"'
+        cache_control = f"private, max-age={PDF_CACHE_MAX_AGE}, immutable"
+    else:
+        etag = '"' + hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode()).hexdigest() + '"'
+        cache_control = "private, no-cache"
+
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+
+    # If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request.headers:
+        if _not_modified_since(request.headers["if-modified-since"], stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat.st_size}"})
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{stat.st_size}"
+            headers["content-length"] = str(end - start + 1)
+            return StreamingResponse(
+                _read_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,401 @@
+"""
+Background jobs for document extraction and matching.
+
+Submitting a job stores it in the jobs table and hands it to a bounded worker
+pool (threads by default, processes with JOB_EXECUTOR=process), so the HTTP
+request returns immediately. Workers open their own database session, record
+the current stage and per-stage timings on the job row, and mark it
+succeeded or failed when done.
+
+Batches of uploaded documents run as a pipeline: a bounded pool of threads
+extracts the documents while a second thread matches those already extracted.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import traceback
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.models.models import Batch, Document, LineItem, Job
+from app.services.blob_store import record_extraction
+from app.services.document_service import (
+    extract_document_content,
+    get_document_pdf_path,
+    save_extracted_items,
+    match_and_save_line_items
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of jobs executed concurrently
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+# "thread" or "process"
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "thread")
+
+JOB_KINDS = ("extract", "match", "process")
+
+# Extracted batch documents that may wait for the matching stage
+BATCH_PIPELINE_DEPTH = int(os.getenv("BATCH_PIPELINE_DEPTH", "4"))
+
+# Documents of a batch extracted concurrently
+BATCH_EXTRACT_WORKERS = int(os.getenv("BATCH_EXTRACT_WORKERS", "4"))
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+class JobError(Exception):
+    """
+    Raised when a job stage cannot complete
+    """
+
+
+def get_job_executor() -> Executor:
+    """
+    Return the process-wide job worker pool, creating it on first use
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if JOB_EXECUTOR == "process":
+                    _executor = ProcessPoolExecutor(
+                        max_workers=JOB_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+                logger.info(f"Started job pool with {JOB_WORKERS} {JOB_EXECUTOR} workers")
+    return _executor
+
+
+def shutdown_job_executor() -> None:
+    """
+    Stop the job worker pool, waiting for running jobs
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def submit_job(db: Session, document_id: int, kind: str) -> Job:
+    """
+    Store a new job for a document and queue it on the worker pool
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(document_id=document_id, kind=kind, status="queued", created_at=datetime.utcnow(), timings={})
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    get_job_executor().submit(run_job, job.id)
+    logger.info(f"Queued {kind} job {job.id} for document {document_id}")
+    return job
+
+
+def _update_job(db: Session, job: Job, **fields: Any) -> None:
+    """
+    Set fields on the job row and commit so pollers see the progress
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    db.commit()
+
+
+def _extract(db: Session, document: Document) -> Dict[str, Any]:
+    """
+    Extraction stage: extract line items from the stored PDF and save them
+    """
+    file_path = get_document_pdf_path(document)
+    if not os.path.exists(file_path):
+        raise JobError(f"PDF file for document {document.id} not found")
+
+    with open(file_path, "rb") as file_content:
+        extracted_content, source = extract_document_content(file_content, document.sha256)
+
+    if document.sha256:
+        record_extraction(db, document.sha256, source)
+
+    if not extracted_content:
+        raise JobError("Failed to extract content from document")
+    if len(extracted_content) == 1 and "error" in extracted_content[0]:
+        raise JobError(extracted_content[0]["error"])
+
+    extracted_items = save_extracted_items(db, document, extracted_content)
+    db.commit()
+    return {"extracted_items": sum(1 for item in extracted_items if item["description"] != "TABLE_STRUCTURE")}
+
+
+def _match(db: Session, document: Document) -> Dict[str, Any]:
+    """
+    Matching stage: match the document's line items and save the matches
+    """
+    line_items = db.query(LineItem).filter(LineItem.document_id == document.id).all()
+    processed_items = match_and_save_line_items(db, line_items) if line_items else []
+    db.commit()
+    return {
+        "matched_items": sum(1 for item in processed_items if item["matches"]),
+        "line_items": len(line_items)
+    }
+
+
+STAGES = {"extract": _extract, "match": _match}
+
+
+def _execute_job(
+    db: Session,
+    job_id: int,
+    stages: Optional[Sequence[str]] = None,
+    start: bool = True,
+    finish: bool = True
+) -> bool:
+    """
+    Run stages of a job (by default those of its kind), writing progress to
+    the job row. start marks the job running and finish marks it succeeded,
+    so a pipeline can run the stages of one job in different workers.
+    Returns False if the job failed
+    """
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} not found")
+            return False
+
+        if start:
+            started_at = datetime.utcnow()
+            timings: Dict[str, float] = {}
+            if job.created_at is not None:
+                timings["queued"] = (started_at - job.created_at).total_seconds()
+            _update_job(db, job, status="running", started_at=started_at, timings=timings)
+
+        document = db.get(Document, job.document_id)
+        if document is None:
+            raise JobError(f"Document with ID {job.document_id} not found")
+
+        if stages is None:
+            stages = []
+            if job.kind in ("extract", "process"):
+                stages.append("extract")
+            if job.kind in ("match", "process"):
+                stages.append("match")
+
+        for stage in stages:
+            _update_job(db, job, stage=stage)
+            start_time = time.perf_counter()
+            stage_result = STAGES[stage](db, document)
+            timings = {**(job.timings or {}), stage: time.perf_counter() - start_time}
+            _update_job(db, job, timings=timings, result={**(job.result or {}), **stage_result})
+
+        if finish:
+            _update_job(db, job, status="succeeded", stage=None, finished_at=datetime.utcnow())
+            logger.info(f"Job {job_id} succeeded in {sum(job.timings.values()):.2f} seconds")
+        return True
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Job {job_id} failed: {str(e)}")
+        logger.error(traceback.format_exc())
+        job = db.get(Job, job_id)
+        if job is not None:
+            _update_job(db, job, status="failed", error=str(e), finished_at=datetime.utcnow())
+        return False
+
+
+def run_job(job_id: int) -> None:
+    """
+    Execute a job in a worker; all state changes are written to the job row
+    """
+    db = SessionLocal()
+    try:
+        _execute_job(db, job_id)
+    finally:
+        db.close()
+
+
+def submit_batch(db: Session, document_ids: List[int], rejected: Optional[List[str]] = None) -> Batch:
+    """
+    Store a batch with a process job per document and queue its pipeline;
+    rejected lists the uploaded files that were not turned into documents
+    """
+    batch = Batch(status="queued", rejected=rejected or [], created_at=datetime.utcnow())
+    db.add(batch)
+    db.flush()
+    db.add_all([
+        Job(document_id=document_id, batch_id=batch.id, kind="process", status="queued",
+            created_at=batch.created_at, timings={})
+        for document_id in document_ids
+    ])
+    db.commit()
+    db.refresh(batch)
+
+    get_job_executor().submit(run_batch, batch.id)
+    logger.info(f"Queued batch {batch.id} with {len(document_ids)} documents")
+    return batch
+
+
+def _hand_over(extracted: "queue.Queue[Optional[int]]", job_id: Optional[int], matcher: threading.Thread) -> bool:
+    """
+    Put a job (or the final None) on the match queue of a batch pipeline.
+    Returns False instead of blocking forever if the matcher thread is gone
+    """
+    while matcher.is_alive():
+        try:
+            extracted.put(job_id, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _extract_batch_job(job_id: int, extracted: "queue.Queue[Optional[int]]", matcher: threading.Thread) -> None:
+    """
+    Extraction stage of a batch pipeline: extract one job and hand it to matching
+    """
+    db = SessionLocal()
+    try:
+        if _execute_job(db, job_id, stages=("extract",), finish=False) and not _hand_over(extracted, job_id, matcher):
+            logger.error(f"Matcher of job {job_id} stopped, job not matched")
+    finally:
+        db.close()
+
+
+def _match_batch_jobs(extracted: "queue.Queue[Optional[int]]") -> None:
+    """
+    Matching stage of a batch pipeline: match each extracted job until None.
+    A job that cannot even be marked failed is skipped, so the queue keeps
+    draining; the batch fails it when it finishes
+    """
+    db = SessionLocal()
+    try:
+        while (job_id := extracted.get()) is not None:
+            try:
+                _execute_job(db, job_id, stages=("match",), start=False)
+            except Exception as e:
+                logger.error(f"Matching job {job_id} failed: {str(e)}")
+                db.rollback()
+    finally:
+        db.close()
+
+
+def _finish_batch(db: Session, batch_id: int, aborted: bool) -> None:
+    """
+    Mark a batch completed, or failed if its pipeline aborted; jobs the
+    pipeline did not finish are marked failed
+    """
+    batch = db.get(Batch, batch_id)
+    if batch is None:
+        return
+
+    finished_at = datetime.utcnow()
+    unfinished = db.scalars(
+        select(Job).where(Job.batch_id == batch_id, Job.status.in_(("queued", "running")))
+    ).all()
+    for job in unfinished:
+        job.status = "failed"
+        job.error = "Batch aborted before the job finished"
+        job.finished_at = finished_at
+
+    batch.status = "failed" if aborted or unfinished else "completed"
+    batch.finished_at = finished_at
+    db.commit()
+    logger.info(f"Batch {batch_id} {batch.status}")
+
+
+def run_batch(batch_id: int) -> None:
+    """
+    Process the jobs of a batch as a two-stage pipeline: a pool of
+    BATCH_EXTRACT_WORKERS threads extracts the documents while a second
+    thread matches the ones already extracted, in the order they finish.
+    The bounded queue between them holds back extraction when matching
+    falls behind
+    """
+    db = SessionLocal()
+    extracted: "queue.Queue[Optional[int]]" = queue.Queue(maxsize=BATCH_PIPELINE_DEPTH)
+    matcher = threading.Thread(target=_match_batch_jobs, args=(extracted,), name=f"batch-{batch_id}-match")
+    matcher.start()
+    aborted = False
+
+    try:
+        batch = db.get(Batch, batch_id)
+        if batch is None:
+            logger.warning(f"Batch {batch_id} not found")
+            return
+        batch.status = "running"
+        db.commit()
+
+        job_ids = db.scalars(select(Job.id).where(Job.batch_id == batch_id).order_by(Job.id)).all()
+        with ThreadPoolExecutor(max_workers=BATCH_EXTRACT_WORKERS, thread_name_prefix=f"batch-{batch_id}-extract") as extractors:
+            futures = [extractors.submit(_extract_batch_job, job_id, extracted, matcher) for job_id in job_ids]
+            for future in futures:
+                future.result()
+
+    except Exception as e:
+        aborted = True
+        db.rollback()
+        logger.error(f"Batch {batch_id} aborted: {str(e)}")
+        logger.error(traceback.format_exc())
+
+    finally:
+        _hand_over(extracted, None, matcher)
+        matcher.join()
+        _finish_batch(db, batch_id, aborted)
+        db.close()
+
+
+def get_batch_status(db: Session, batch_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Status of a batch with the job status of each of its documents
+    """
+    batch = db.get(Batch, batch_id)
+    if batch is None:
+        return None
+
+    rows = db.execute(
+        select(Job.id, Job.document_id, Job.status, Job.stage, Job.error, Document.filename, Document.sha256)
+        .join(Document, Document.id == Job.document_id)
+        .where(Job.batch_id == batch_id)
+        .order_by(Job.id)
+    ).all()
+
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row.status] = counts.get(row.status, 0) + 1
+
+    return {
+        "id": batch.id,
+        "status": batch.status,
+        "created_at": batch.created_at,
+        "finished_at": batch.finished_at,
+        "counts": counts,
+        "rejected": batch.rejected or [],
+        "documents": [
+            {
+                "document_id": row.document_id,
+                "filename": row.filename,
+                "sha256": row.sha256,
+                "job_id": row.id,
+                "status": row.status,
+                "stage": row.stage,
+                "error": row.error,
+            }
+            for row in rows
+        ],
+    }
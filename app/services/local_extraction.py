@@ -0,0 +1,224 @@
+"""
+Local PDF extraction from the text layer with pypdf.
+
+Digitally generated purchase orders carry a text layer whose layout mode keeps
+the column alignment of the line item table. This module finds the table
+header (item/description, quantity, price columns), groups wrapped description
+lines into rows and reports how confidently the table was parsed, so the
+OpenAI extraction only has to run for scanned or irregular documents.
+"""
+
+import os
+import re
+import logging
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
+
+from pypdf import PdfReader
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Set to "0" to always use the OpenAI extraction
+LOCAL_EXTRACTION_ENABLED = os.getenv("LOCAL_EXTRACTION_ENABLED", "1") != "0"
+
+# Minimum share of table lines that must be parsed into rows to skip OpenAI
+LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", "0.9"))
+
+# Cells are separated by runs of at least this many spaces in layout mode
+# (descriptions themselves contain runs of two or three spaces)
+CELL_GAP = 4
+
+DESCRIPTION_HEADERS = ("description", "item", "product")
+QUANTITY_HEADERS = ("quantity", "qty", "amount", "count")
+NUMBER_PATTERN = re.compile(r"^[$€£]?-?\d[\d,]*(\.\d+)?$")
+
+
+def _split_cells(line: str) -> List[Tuple[int, int, str]]:
+    """
+    Split a layout-mode line into (start, end, text) cells
+    """
+    cells = []
+    for match in re.finditer(rf"\S+(?: {{1,{CELL_GAP - 1}}}\S+)*", line):
+        cells.append((match.start(), match.end(), re.sub(r"\s+", " ", match.group(0))))
+    return cells
+
+
+def _find_header(cells: List[Tuple[int, int, str]]) -> Optional[Tuple[int, int]]:
+    """
+    Return (description column, quantity column) if the cells look like a
+    line item table header, otherwise None
+    """
+    names = [text.lower() for _, _, text in cells]
+
+    description_column = None
+    for keyword in DESCRIPTION_HEADERS:
+        description_column = next((i for i, name in enumerate(names) if keyword in name.split()), None)
+        if description_column is not None:
+            break
+
+    quantity_column = None
+    for keyword in QUANTITY_HEADERS:
+        quantity_column = next(
+            (i for i, name in enumerate(names) if keyword in name.split() and i != description_column),
+            None
+        )
+        if quantity_column is not None:
+            break
+
+    if description_column is None or quantity_column is None:
+        return None
+    return description_column, quantity_column
+
+
+def parse_line_item_table(text: str) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Parse the line item table out of layout-mode page text
+    Returns the table (title, columns, rows) and a confidence between 0 and 1
+    """
+    lines = text.split("\n")
+
+    header = None
+    for line_number, line in enumerate(lines):
+        cells = _split_cells(line)
+        columns = _find_header(cells)
+        if columns is not None:
+            header = (line_number, cells, columns)
+            break
+
+    if header is None:
+        return None, 0.0
+
+    header_line, header_cells, (description_column, quantity_column) = header
+    column_names = [name for _, _, name in header_cells]
+    column_starts = [start for start, _, _ in header_cells]
+    numeric_area_start = min(start for i, start in enumerate(column_starts) if i > description_column) \
+        if description_column < len(column_starts) - 1 else None
+
+    rows = []
+    quantities = []
+    pending_description: List[str] = []
+    pending_lines = 0
+    table_lines = 0
+    parsed_lines = 0
+    row_cells: Dict[int, str] = {}
+
+    for line in lines[header_line + 1:]:
+        cells = _split_cells(line)
+        if not cells:
+            continue
+
+        line_description = []
+        line_values: Dict[int, str] = {}
+        ends_table = False
+
+        for start, end, cell in cells:
+            if NUMBER_PATTERN.match(cell):
+                # Numbers are right-aligned: they belong to the last header starting at or before their last character
+                column = max((i for i, column_start in enumerate(column_starts) if column_start <= end - 1), default=0)
+                if column == description_column:
+                    line_description.append(cell)
+                else:
+                    line_values[column] = cell
+            elif numeric_area_start is not None and start >= numeric_area_start:
+                # Text under the numeric columns (subtotals, notes) means the table is over
+                ends_table = True
+            else:
+                line_description.append(cell)
+
+        if ends_table:
+            break
+
+        table_lines += 1
+        pending_description.extend(line_description)
+        pending_lines += 1
+        row_cells.update(line_values)
+
+        if quantity_column in line_values:
+            # The quantity closes the row; wrapped description lines above belong to it
+            row = [""] * len(column_names)
+            row[description_column] = " ".join(pending_description)
+            for column, value in row_cells.items():
+                row[column] = value
+            rows.append(row)
+            quantities.append(line_values[quantity_column])
+            parsed_lines += pending_lines
+            pending_description = []
+            pending_lines = 0
+            row_cells = {}
+
+    if not rows:
+        return None, 0.0
+
+    confidence = parsed_lines / table_lines if table_lines else 0.0
+
+    # Rows without a description or with a non-integer quantity are suspicious
+    valid_rows = sum(
+        1 for row, quantity in zip(rows, quantities)
+        if row[description_column] and quantity.replace(",", "").isdigit()
+    )
+    confidence *= valid_rows / len(rows)
+
+    table = {
+        "title": "Document Content",
+        "columns": column_names,
+        "rows": rows,
+        "quantity_column": quantity_column,
+    }
+    return table, confidence
+
+
+def extract_line_items_locally(file: BinaryIO) -> Tuple[Optional[List[Dict[str, Any]]], float]:
+    """
+    Extract line items from the PDF text layer
+    Returns the items in the same format as the OpenAI extraction (or None if
+    no table was found) and the parse confidence
+    """
+    try:
+        file.seek(0)
+        reader = PdfReader(file)
+        pages = [page.extract_text(extraction_mode="layout") or "" for page in reader.pages]
+    except Exception as e:
+        logger.warning(f"Could not read PDF text layer: {e}")
+        return None, 0.0
+    finally:
+        file.seek(0)
+
+    if not any(page.strip() for page in pages):
+        logger.info("PDF has no text layer")
+        return None, 0.0
+
+    columns = None
+    rows = []
+    confidences = []
+    for page in pages:
+        table, confidence = parse_line_item_table(page)
+        if table is None:
+            continue
+        if columns is None:
+            columns = table["columns"]
+            quantity_column = table["quantity_column"]
+        elif table["columns"] != columns:
+            # Tables with different layouts on different pages are left to the LLM
+            return None, 0.0
+        rows.extend(table["rows"])
+        confidences.append(confidence)
+
+    if not rows:
+        return None, 0.0
+
+    table = {"title": "Document Content", "columns": columns, "rows": rows}
+    items = [{
+        "description": "TABLE_STRUCTURE",
+        "quantity": 1,
+        "table_data": table
+    }]
+
+    # Same row text as the OpenAI extraction, with the parsed quantity
+    for row in rows:
+        quantity = row[quantity_column].replace(",", "")
+        items.append({
+            "description": " | ".join(row),
+            "quantity": int(quantity) if quantity.isdigit() else 1
+        })
+
+    return items, min(confidences)
@@ -0,0 +1,187 @@
+"""
+Multi-core matching with a persistent process pool.
+
+Every worker process builds the resident catalog index once when it starts and
+keeps it in memory. A matching call is split into shards, either over the
+catalog candidates (every worker scores every n-th candidate of each
+description) or over the descriptions, and the per-shard top N lists are
+merged in the calling process.
+"""
+
+import os
+import heapq
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.catalog_index import CATALOG_CSV_PATH
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of matcher processes; 0 or 1 keeps matching in the calling process
+MATCHER_WORKERS = int(os.getenv("MATCHER_WORKERS", "0"))
+
+# How work is split: "catalog", "descriptions" or "auto"
+MATCHER_SHARD_BY = os.getenv("MATCHER_SHARD_BY", "auto")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Catalog path of the worker process, set by the pool initializer
+_worker_csv_path = CATALOG_CSV_PATH
+
+
+def _init_worker(csv_file_path: str) -> None:
+    """
+    Pool initializer: load the catalog index into the worker process
+    """
+    global _worker_csv_path
+    from app.services.catalog_index import get_catalog_index
+
+    _worker_csv_path = csv_file_path
+    get_catalog_index(csv_file_path)
+
+
+def _ping() -> int:
+    """
+    No-op task used to start the worker processes
+    """
+    return os.getpid()
+
+
+def _match_catalog_shard(
+    descriptions: List[str],
+    top_n: int,
+    blocking: bool,
+    shard: Tuple[int, int]
+) -> Dict[str, List[Tuple[float, int, str]]]:
+    """
+    Worker task: score all descriptions against one shard of the catalog
+    """
+    from app.services.catalog_index import get_catalog_index
+    from app.services.custom_matcher import score_description
+
+    index = get_catalog_index(_worker_csv_path)
+    return {
+        description: [
+            (score, row, index.descriptions[row])
+            for score, row in score_description(index, description, top_n=top_n, blocking=blocking, shard=shard)
+        ]
+        for description in descriptions
+    }
+
+
+def _match_descriptions_shard(
+    descriptions: List[str],
+    top_n: int,
+    blocking: bool,
+    engine: Optional[str]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Worker task: match a subset of the descriptions against the full catalog
+    """
+    from app.services.catalog_index import get_catalog_index
+    from app.services.custom_matcher import match_line_items_custom
+
+    index = get_catalog_index(_worker_csv_path)
+    return match_line_items_custom(descriptions, top_n=top_n, catalog_index=index, blocking=blocking, engine=engine)
+
+
+def get_matcher_pool(workers: int = MATCHER_WORKERS, csv_file_path: str = CATALOG_CSV_PATH) -> ProcessPoolExecutor:
+    """
+    Return the process-wide matcher pool, creating it on first use
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned workers do not inherit the parent's database connections
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(csv_file_path,)
+                )
+    return _pool
+
+
+def start_matcher_pool(workers: int = MATCHER_WORKERS) -> None:
+    """
+    Start all worker processes so they load the catalog before the first request
+    """
+    if workers <= 1:
+        return
+
+    pool = get_matcher_pool(workers)
+    pids = {future.result() for future in [pool.submit(_ping) for _ in range(workers)]}
+    logger.info(f"Matcher pool started with {len(pids)} worker processes")
+
+
+def shutdown_matcher_pool() -> None:
+    """
+    Stop the worker processes
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def match_line_items_sharded(
+    descriptions: List[str],
+    top_n: int = 5,
+    blocking: bool = True,
+    engine: Optional[str] = None,
+    workers: int = MATCHER_WORKERS,
+    shard_by: str = MATCHER_SHARD_BY
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Match line item descriptions across the process pool
+    Returns the same top N matches as the single-process matcher
+    """
+    queries = list(dict.fromkeys(description for description in descriptions if description))
+    if not queries:
+        return {}
+
+    pool = get_matcher_pool(workers)
+
+    # Many descriptions split naturally; few descriptions split the catalog instead.
+    # The TF-IDF engine scores the full catalog in one multiply, so it always splits descriptions.
+    if shard_by == "auto":
+        shard_by = "descriptions" if len(queries) >= workers else "catalog"
+    if engine == "tfidf":
+        shard_by = "descriptions"
+
+    if shard_by == "descriptions":
+        chunk_size = -(-len(queries) // workers)
+        futures = [
+            pool.submit(_match_descriptions_shard, queries[start:start + chunk_size], top_n, blocking, engine)
+            for start in range(0, len(queries), chunk_size)
+        ]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return {query: results[query] for query in queries if query in results}
+
+    futures = [
+        pool.submit(_match_catalog_shard, queries, top_n, blocking, (shard_id, workers))
+        for shard_id in range(workers)
+    ]
+    shard_results = [future.result() for future in futures]
+
+    # Merge the per-shard top N lists: best score first, ties in catalog order
+    results = {}
+    for query in queries:
+        merged = heapq.nsmallest(
+            top_n,
+            (match for shard in shard_results for match in shard[query]),
+            key=lambda match: (-match[0], match[1])
+        )
+        results[query] = [{"match": description, "score": score} for score, _, description in merged]
+    return results
@@ -4,15 +4,27 @@ PDF Extraction Service using OpenAI API.
 This service extracts text content from PDF documents and formats it as a table.
 """
 
+import io
 import os
 import time
+import asyncio
 import logging
 import tempfile
 import json
-from typing import List, Dict, Any, BinaryIO
-from openai import OpenAI
+import hashlib
+import weakref
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
+from app.services.extraction_cache import content_hash, get_cached_extraction, store_extraction
+from app.services.metrics import OPENAI_ERRORS, STAGE_SECONDS
+from app.services.local_extraction import (
+    LOCAL_EXTRACTION_ENABLED,
+    LOCAL_EXTRACTION_MIN_CONFIDENCE,
+    extract_line_items_locally
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -20,8 +32,209 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
+# Initialize OpenAI clients
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Maximum number of OpenAI extractions in flight at once (async path)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+_openai_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# Model used for extraction
+EXTRACTION_MODEL = os.getenv("OPENAI_EXTRACTION_MODEL", "gpt-4.1")
+
+# Prompt for extracting text as a table
+EXTRACTION_PROMPT = """
+Please extract all text content from this PDF document and format it as a table.
+
+Rules:
+1. Identify any tabular data in the document and preserve its structure
+2. For invoices or purchase orders, identify columns like "Item", "Description", "Quantity", "Price" etc.
+3. Please ignore informations not in tabular
+Format your response as a JSON object with the following structure:
+{
+  "table_title": "Document Content",
+  "columns": ["Column1", "Column2", "Column3"],
+  "rows": [
+    ["Row1-Col1", "Row1-Col2", "Row1-Col3"],
+    ["Row2-Col1", "Row2-Col2", "Row2-Col3"]
+  ]
+}
+
+The column names should reflect the type of content in the document.
+Include all the text content from the document, organized in a logical table structure.
+"""
+
+# Extraction results are cached per prompt version; changing the prompt
+# (or the parsing below, by bumping EXTRACTION_PARSER_VERSION) invalidates them
+EXTRACTION_PARSER_VERSION = "1"
+PROMPT_VERSION = hashlib.sha256(f"{EXTRACTION_PARSER_VERSION}:{EXTRACTION_PROMPT}".encode("utf-8")).hexdigest()[:12]
+
+
+def _extraction_input(file_id: str) -> List[Dict[str, Any]]:
+    """
+    Build the Responses API input for an uploaded PDF
+    """
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "input_file",
+                    "file_id": file_id,
+                },
+                {
+                    "type": "input_text",
+                    "text": EXTRACTION_PROMPT,
+                },
+            ]
+        }
+    ]
+
+
+def _response_text(response: Any) -> str:
+    """
+    Get the text content of a Responses API response
+    """
+    # Extract content from the response
+    content = ""
+    try:
+        # Based on the response structure:
+        # Response.output[0].content[0].text is where the text content is
+        if hasattr(response, 'output') and response.output:
+            # Access the first message in the output array
+            output_message = response.output[0]
+            if hasattr(output_message, 'content') and output_message.content:
+                # Access the first content item in the message
+                content_item = output_message.content[0]
+                if hasattr(content_item, 'text'):
+                    # This is where the actual text is
+                    content = content_item.text
+                    logger.info("Successfully extracted text from response")
+                else:
+                    content = str(content_item)
+            else:
+                content = str(output_message)
+        else:
+            content = str(response)
+    except Exception as e:
+        logger.error(f"Error extracting content from response: {e}")
+        content = str(response)
+    
+    return content
+
+
+def _parse_table_content(content: str) -> List[Dict[str, Any]]:
+    """
+    Parse the model output into the TABLE_STRUCTURE item followed by one
+    item per table row. Output that is not a JSON table becomes a one-column
+    table of its lines, marked with "fallback" so it is not cached
+    """
+    # Try to parse the JSON table structure
+    try:
+        # Look for JSON object in the text
+        import re
+        json_match = re.search(r'\{.*\}', content, re.DOTALL)
+
+        if json_match:
+            json_text = json_match.group(0)
+            table_data = json.loads(json_text)
+
+            # Create a standardized table structure
+            table = {
+                "title": table_data.get("table_title", "Document Content"),
+                "columns": table_data.get("columns", ["Content"]),
+                "rows": table_data.get("rows", [])
+            }
+
+            # If the JSON doesn't have the expected structure, try to extract what we can
+            if "rows" not in table_data and "data" in table_data:
+                table["rows"] = table_data["data"]
+
+            # Create line items from the table data
+            items = []
+
+            # Create a special first item that contains the table structure
+            items.append({
+                "description": "TABLE_STRUCTURE",
+                "quantity": 1,
+                "table_data": table
+            })
+
+            # Add individual rows as line items for backwards compatibility
+            for row in table["rows"]:
+                if isinstance(row, list) and len(row) > 0:
+                    # Join all columns with a delimiter for display
+                    row_text = " | ".join([str(cell) for cell in row])
+                    items.append({
+                        "description": row_text,
+                        "quantity": 1
+                    })
+
+            logger.info(f"Successfully parsed table with {len(table['rows'])} rows and {len(table['columns'])} columns")
+
+        else:
+            # If no JSON found, create a basic table from the text
+            logger.warning("No JSON table found in response, creating basic table")
+            lines = content.strip().split('\n')
+
+            # Create a basic single-column table
+            table = {
+                "title": "Document Content",
+                "columns": ["Content"],
+                "rows": [[line] for line in lines if line.strip()]
+            }
+
+            items = []
+
+            # Create a special first item that contains the table structure
+            items.append({
+                "description": "TABLE_STRUCTURE",
+                "quantity": 1,
+                "table_data": table,
+                "fallback": True
+            })
+
+            # Add individual lines as items for backwards compatibility
+            for line in lines:
+                if line.strip():
+                    items.append({
+                        "description": line.strip(),
+                        "quantity": 1
+                    })
+
+    except Exception as e:
+        OPENAI_ERRORS.inc(step="parse")
+        logger.error(f"Error parsing table data: {e}")
+        # Fall back to simple line-by-line output
+        lines = content.strip().split('\n')
+
+        # Create a basic single-column table
+        table = {
+            "title": "Document Content",
+            "columns": ["Content"],
+            "rows": [[line] for line in lines if line.strip()]
+        }
+
+        items = []
+
+        # Create a special first item that contains the table structure
+        items.append({
+            "description": "TABLE_STRUCTURE",
+            "quantity": 1,
+            "table_data": table,
+            "fallback": True
+        })
+
+        # Add individual lines as items for backwards compatibility
+        for line in lines:
+            if line.strip():
+                items.append({
+                    "description": line.strip(),
+                    "quantity": 1
+                })
+    
+    return items
 
 
 def extract_line_items_with_openai_file_processing(file: BinaryIO) -> List[Dict[str, Any]]:
@@ -29,6 +242,7 @@ def extract_line_items_with_openai_file_processing(file: BinaryIO) -> List[Dict[
     Extract text content from a PDF using OpenAI and format it as a table
     This uploads the PDF directly to OpenAI and returns the content in a table format
     """
+    step = "upload"
     try:
         # Save the file temporarily so we can upload it with a reliable file path
         with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
@@ -42,182 +256,30 @@ def extract_line_items_with_openai_file_processing(file: BinaryIO) -> List[Dict[
         try:
             # Upload the file directly to OpenAI
             logger.info("Uploading PDF to OpenAI...")
-            uploaded_file = client.files.create(
-                file=open(temp_file_path, "rb"),
-                purpose="user_data"  # Use user_data purpose for files
-            )
+            step = "upload"
+            with STAGE_SECONDS.time(stage="openai_upload"):
+                uploaded_file = client.files.create(
+                    file=open(temp_file_path, "rb"),
+                    purpose="user_data"  # Use user_data purpose for files
+                )
             logger.info(f"File uploaded with ID: {uploaded_file.id}")
             
-            # Create a prompt for extracting text as a table
-            prompt = """
-            Please extract all text content from this PDF document and format it as a table.
-            
-            Rules:
-            1. Identify any tabular data in the document and preserve its structure
-            2. For invoices or purchase orders, identify columns like "Item", "Description", "Quantity", "Price" etc.
-            3. Please ignore informations not in tabular
-            Format your response as a JSON object with the following structure:
-            {
-              "table_title": "Document Content",
-              "columns": ["Column1", "Column2", "Column3"],
-              "rows": [
-                ["Row1-Col1", "Row1-Col2", "Row1-Col3"],
-                ["Row2-Col1", "Row2-Col2", "Row2-Col3"]
-              ]
-            }
-            
-            The column names should reflect the type of content in the document.
-            Include all the text content from the document, organized in a logical table structure.
-            """
-            
             # Process the PDF using the file ID
             logger.info(f"Processing PDF with OpenAI (file ID: {uploaded_file.id})...")
-            response = client.responses.create(
-                model="gpt-4.1",
-                input=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "input_file",
-                                "file_id": uploaded_file.id,
-                            },
-                            {
-                                "type": "input_text",
-                                "text": prompt,
-                            },
-                        ]
-                    }
-                ]
-            )
+            step = "inference"
+            with STAGE_SECONDS.time(stage="openai_inference"):
+                response = client.responses.create(
+                    model=EXTRACTION_MODEL,
+                    input=_extraction_input(uploaded_file.id)
+                )
             
-            # Extract content from the response
-            content = ""
-            try:
-                # Based on the response structure:
-                # Response.output[0].content[0].text is where the text content is
-                if hasattr(response, 'output') and response.output:
-                    # Access the first message in the output array
-                    output_message = response.output[0]
-                    if hasattr(output_message, 'content') and output_message.content:
-                        # Access the first content item in the message
-                        content_item = output_message.content[0]
-                        if hasattr(content_item, 'text'):
-                            # This is where the actual text is
-                            content = content_item.text
-                            logger.info("Successfully extracted text from response")
-                        else:
-                            content = str(content_item)
-                    else:
-                        content = str(output_message)
-                else:
-                    content = str(response)
-            except Exception as e:
-                logger.error(f"Error extracting content from response: {e}")
-                content = str(response)
+            content = _response_text(response)
             
             logger.info(f"OpenAI response received: {len(content)} characters")
             
-            # Try to parse the JSON table structure
-            try:
-                # Look for JSON object in the text
-                import re
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                
-                if json_match:
-                    json_text = json_match.group(0)
-                    table_data = json.loads(json_text)
-                    
-                    # Create a standardized table structure
-                    table = {
-                        "title": table_data.get("table_title", "Document Content"),
-                        "columns": table_data.get("columns", ["Content"]),
-                        "rows": table_data.get("rows", [])
-                    }
-                    
-                    # If the JSON doesn't have the expected structure, try to extract what we can
-                    if "rows" not in table_data and "data" in table_data:
-                        table["rows"] = table_data["data"]
-                    
-                    # Create line items from the table data
-                    items = []
-                    
-                    # Create a special first item that contains the table structure
-                    items.append({
-                        "description": "TABLE_STRUCTURE",
-                        "quantity": 1,
-                        "table_data": table
-                    })
-                    
-                    # Add individual rows as line items for backwards compatibility
-                    for row in table["rows"]:
-                        if isinstance(row, list) and len(row) > 0:
-                            # Join all columns with a delimiter for display
-                            row_text = " | ".join([str(cell) for cell in row])
-                            items.append({
-                                "description": row_text,
-                                "quantity": 1
-                            })
-                    
-                    logger.info(f"Successfully parsed table with {len(table['rows'])} rows and {len(table['columns'])} columns")
-                    
-                else:
-                    # If no JSON found, create a basic table from the text
-                    logger.warning("No JSON table found in response, creating basic table")
-                    lines = content.strip().split('\n')
-                    
-                    # Create a basic single-column table
-                    table = {
-                        "title": "Document Content",
-                        "columns": ["Content"],
-                        "rows": [[line] for line in lines if line.strip()]
-                    }
-                    
-                    items = []
-                    
-                    # Create a special first item that contains the table structure
-                    items.append({
-                        "description": "TABLE_STRUCTURE",
-                        "quantity": 1,
-                        "table_data": table
-                    })
-                    
-                    # Add individual lines as items for backwards compatibility
-                    for line in lines:
-                        if line.strip():
-                            items.append({
-                                "description": line.strip(),
-                                "quantity": 1
-                            })
-            
-            except Exception as e:
-                logger.error(f"Error parsing table data: {e}")
-                # Fall back to simple line-by-line output
-                lines = content.strip().split('\n')
-                
-                # Create a basic single-column table
-                table = {
-                    "title": "Document Content",
-                    "columns": ["Content"],
-                    "rows": [[line] for line in lines if line.strip()]
-                }
-                
-                items = []
-                
-                # Create a special first item that contains the table structure
-                items.append({
-                    "description": "TABLE_STRUCTURE",
-                    "quantity": 1,
-                    "table_data": table
-                })
-                
-                # Add individual lines as items for backwards compatibility
-                for line in lines:
-                    if line.strip():
-                        items.append({
-                            "description": line.strip(),
-                            "quantity": 1
-                        })
+            step = "parse"
+            with STAGE_SECONDS.time(stage="json_parse"):
+                items = _parse_table_content(content)
             
             logger.info(f"Extracted table with {len(items)-1} data rows")
             
@@ -239,6 +301,70 @@ def extract_line_items_with_openai_file_processing(file: BinaryIO) -> List[Dict[
                 logger.warning(f"Failed to remove temporary file: {e}")
     
     except Exception as e:
+        OPENAI_ERRORS.inc(step=step)
+        logger.error(f"Error extracting text from PDF with OpenAI: {str(e)}")
+        return [{"description": f"Error extracting text with OpenAI: {str(e)}", "quantity": 1}]
+
+
+def _get_openai_semaphore() -> asyncio.Semaphore:
+    """
+    Semaphore bounding the OpenAI extractions of the running event loop
+    (a semaphore can only be used by the loop it was first awaited on)
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _openai_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _openai_semaphores[loop] = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def extract_line_items_with_openai_file_processing_async(file_content: bytes) -> List[Dict[str, Any]]:
+    """
+    Async version of extract_line_items_with_openai_file_processing
+    Uses AsyncOpenAI so the event loop keeps serving other requests, with at
+    most OPENAI_MAX_CONCURRENCY extractions in flight
+    """
+    step = "upload"
+    try:
+        async with _get_openai_semaphore():
+            # Upload the PDF bytes directly, no temporary file needed
+            logger.info("Uploading PDF to OpenAI...")
+            with STAGE_SECONDS.time(stage="openai_upload"):
+                uploaded_file = await async_client.files.create(
+                    file=("document.pdf", file_content, "application/pdf"),
+                    purpose="user_data"
+                )
+            logger.info(f"File uploaded with ID: {uploaded_file.id}")
+            
+            try:
+                # Process the PDF using the file ID
+                logger.info(f"Processing PDF with OpenAI (file ID: {uploaded_file.id})...")
+                step = "inference"
+                with STAGE_SECONDS.time(stage="openai_inference"):
+                    response = await async_client.responses.create(
+                        model=EXTRACTION_MODEL,
+                        input=_extraction_input(uploaded_file.id)
+                    )
+            finally:
+                # Clean up the uploaded file on OpenAI's servers
+                try:
+                    await async_client.files.delete(uploaded_file.id)
+                    logger.info(f"Deleted file {uploaded_file.id} from OpenAI")
+                except Exception as e:
+                    logger.warning(f"Failed to delete file from OpenAI: {str(e)}")
+        
+        content = _response_text(response)
+        logger.info(f"OpenAI response received: {len(content)} characters")
+        
+        step = "parse"
+        with STAGE_SECONDS.time(stage="json_parse"):
+            items = _parse_table_content(content)
+        logger.info(f"Extracted table with {len(items)-1} data rows")
+        
+        return items
+    
+    except Exception as e:
+        OPENAI_ERRORS.inc(step=step)
         logger.error(f"Error extracting text from PDF with OpenAI: {str(e)}")
         return [{"description": f"Error extracting text with OpenAI: {str(e)}", "quantity": 1}]
 
@@ -246,6 +372,21 @@ def extract_line_items_with_openai_file_processing(file: BinaryIO) -> List[Dict[
 def extract_document_content_with_llm(file: BinaryIO) -> List[Dict[str, Any]]:
     """
     Main function to extract content from PDF document using OpenAI
+    
+    The PDF text layer is tried first; OpenAI is only called when there is no
+    text layer or the local table parse has low confidence.
+    """
+    return extract_document_content_with_source(file)[0]
+
+
+def extract_document_content_with_source(
+    file: BinaryIO,
+    pdf_hash: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Extract content like extract_document_content_with_llm and also report
+    where it came from: "local", "cache", "openai" or "error".
+    Pass pdf_hash when the SHA-256 of the file is already known.
     """
     try:
         # Log file size
@@ -256,12 +397,83 @@ def extract_document_content_with_llm(file: BinaryIO) -> List[Dict[str, Any]]:
         # Reset file pointer for reading
         file.seek(0)
         
+        # Digitally generated POs can be parsed from the text layer without a network round trip
+        if LOCAL_EXTRACTION_ENABLED:
+            start_time = time.time()
+            line_items, confidence = extract_line_items_locally(file)
+            logger.info(f"Local text-layer extraction finished in {time.time() - start_time:.3f} seconds (confidence {confidence:.2f})")
+            if line_items and confidence >= LOCAL_EXTRACTION_MIN_CONFIDENCE:
+                return line_items, "local"
+            logger.info("Local extraction not confident enough, escalating to OpenAI")
+        
+        # Return the stored result for byte-identical PDFs
+        pdf_hash = pdf_hash or content_hash(file_content)
+        line_items = get_cached_extraction(pdf_hash, EXTRACTION_MODEL, PROMPT_VERSION)
+        if line_items is not None:
+            return line_items, "cache"
+        
         # Extract line items using OpenAI's file processing
         logger.info("Extracting line items using OpenAI file processing")
         start_time = time.time()
         line_items = extract_line_items_with_openai_file_processing(file)
         logger.info(f"OpenAI extraction completed in {time.time() - start_time:.2f} seconds")
         
+        store_extraction(pdf_hash, EXTRACTION_MODEL, PROMPT_VERSION, line_items)
+        
+        # If no line items were found
+        if not line_items:
+            logger.warning("No line items found in document")
+            return [{
+                "description": "No line items found in document",
+                "quantity": 1,
+                "error": "The document doesn't appear to contain any recognizable line items"
+            }], "openai"
+        
+        logger.info(f"Successfully extracted {len(line_items)} line items")
+        return line_items, "openai"
+    
+    except Exception as e:
+        logger.error(f"Error in document extraction process: {str(e)}")
+        return [{
+            "description": f"Error processing document: {str(e)}",
+            "quantity": 1,
+            "error": str(e)
+        }], "error" 
+
+
+async def extract_document_content_with_source_async(
+    file_content: bytes,
+    pdf_hash: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Async version of extract_document_content_with_source
+    """
+    try:
+        logger.info(f"PDF file size: {len(file_content)} bytes")
+        
+        # Digitally generated POs can be parsed from the text layer without a network round trip
+        if LOCAL_EXTRACTION_ENABLED:
+            start_time = time.time()
+            line_items, confidence = await asyncio.to_thread(extract_line_items_locally, io.BytesIO(file_content))
+            logger.info(f"Local text-layer extraction finished in {time.time() - start_time:.3f} seconds (confidence {confidence:.2f})")
+            if line_items and confidence >= LOCAL_EXTRACTION_MIN_CONFIDENCE:
+                return line_items, "local"
+            logger.info("Local extraction not confident enough, escalating to OpenAI")
+        
+        # Return the stored result for byte-identical PDFs
+        pdf_hash = pdf_hash or content_hash(file_content)
+        line_items = await asyncio.to_thread(get_cached_extraction, pdf_hash, EXTRACTION_MODEL, PROMPT_VERSION)
+        if line_items is not None:
+            return line_items, "cache"
+        
+        # Extract line items using OpenAI's file processing
+        logger.info("Extracting line items using OpenAI file processing")
+        start_time = time.time()
+        line_items = await extract_line_items_with_openai_file_processing_async(file_content)
+        logger.info(f"OpenAI extraction completed in {time.time() - start_time:.2f} seconds")
+        
+        await asyncio.to_thread(store_extraction, pdf_hash, EXTRACTION_MODEL, PROMPT_VERSION, line_items)
+        
         # If no line items were found
         if not line_items:
             logger.warning("No line items found in document")
@@ -269,10 +481,10 @@ def extract_document_content_with_llm(file: BinaryIO) -> List[Dict[str, Any]]:
                 "description": "No line items found in document",
                 "quantity": 1,
                 "error": "The document doesn't appear to contain any recognizable line items"
-            }]
+            }], "openai"
         
         logger.info(f"Successfully extracted {len(line_items)} line items")
-        return line_items
+        return line_items, "openai"
     
     except Exception as e:
         logger.error(f"Error in document extraction process: {str(e)}")
@@ -280,4 +492,4 @@ def extract_document_content_with_llm(file: BinaryIO) -> List[Dict[str, Any]]:
             "description": f"Error processing document: {str(e)}",
             "quantity": 1,
             "error": str(e)
-        }] 
\ No newline at end of file
+        }], "error"
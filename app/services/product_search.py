@@ -0,0 +1,228 @@
+"""
+Indexed product search for the catalog typeahead.
+
+On PostgreSQL the search uses a pg_trgm GIN index on product_catalog.description:
+candidates contain the query as a substring (ILIKE) or word-similar text (<%),
+so short and partial queries like "M4" still match long descriptions, and are
+ordered by word_similarity() with the LIMIT applied in the database.
+On SQLite an FTS5 table kept in sync by triggers plays the same role, ranked by
+bm25. Either way only `limit` rows ever leave the database, so search time does
+not grow with the size of the catalog.
+"""
+
+import os
+import re
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import Select, func, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models.models import ProductCatalog
+from app.services.catalog_index import get_catalog_index
+from app.services.custom_matcher import calculate_similarity, preprocess_text
+from app.services.tfidf_matcher import get_tfidf_matrix
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# pg_trgm word similarity a description needs to be a search candidate
+# (besides containing the query)
+PRODUCT_SEARCH_MIN_WORD_SIMILARITY = os.getenv("PRODUCT_SEARCH_MIN_WORD_SIMILARITY", "0.5")
+
+TRIGRAM_INDEX = "ix_product_catalog_description_trgm"
+FTS_TABLE = "product_catalog_fts"
+
+# Statements creating the SQLite FTS5 index and the triggers keeping it in sync
+SQLITE_FTS_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5(description, content='product_catalog', content_rowid='id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product_catalog BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product_catalog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF description ON product_catalog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+    f"INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); END",
+]
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Create the search index for the engine's dialect if it does not exist
+    """
+    dialect = engine.dialect.name
+
+    with engine.begin() as connection:
+        if dialect == "postgresql":
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} "
+                f"ON product_catalog USING gin (description gin_trgm_ops)"
+            ))
+        elif dialect == "sqlite":
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": FTS_TABLE}
+            ).first()
+            for statement in SQLITE_FTS_STATEMENTS:
+                connection.execute(text(statement))
+            if not exists:
+                # Index the products that were there before the FTS table
+                connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        else:
+            logger.warning(f"No product search index for dialect {dialect}")
+            return
+
+    logger.info(f"Product search index ready ({dialect})")
+
+
+def _escape_like(query: str) -> str:
+    """
+    Escape LIKE wildcards so the query matches literally
+    """
+    return query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def postgresql_search_statement(query: str, limit: int) -> Select:
+    """
+    Trigram search statement: the GIN index serves both ILIKE and the <%
+    (word similarity) operator. word_similarity() scores the query against
+    the best matching part of a description rather than all of it, so a
+    short query is not penalised for the length of the description
+    """
+    return (
+        select(ProductCatalog)
+        .where(or_(
+            ProductCatalog.description.ilike(f"%{_escape_like(query)}%", escape="\\"),
+            text(":query <% product_catalog.description").bindparams(query=query)
+        ))
+        .order_by(
+            func.word_similarity(query, ProductCatalog.description).desc(),
+            func.similarity(ProductCatalog.description, query).desc(),
+            ProductCatalog.id
+        )
+        .limit(limit)
+    )
+
+
+def _search_postgresql(db: Session, query: str, limit: int) -> List[ProductCatalog]:
+    """
+    Trigram search with the word similarity threshold set for the transaction
+    """
+    db.execute(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+        {"threshold": PRODUCT_SEARCH_MIN_WORD_SIMILARITY}
+    )
+    return list(db.scalars(postgresql_search_statement(query, limit)))
+
+
+def _fts_query(terms: List[str], operator: str) -> str:
+    """
+    Build an FTS5 prefix query from the search terms
+    """
+    return f" {operator} ".join(f'"{term}"*' for term in terms)
+
+
+def _search_sqlite(db: Session, query: str, limit: int) -> List[ProductCatalog]:
+    """
+    FTS5 search: products containing all terms first, then any term, by bm25
+    """
+    terms = re.findall(r"\w+", query.lower())
+    if not terms:
+        return []
+
+    products: List[ProductCatalog] = []
+    seen = set()
+    for operator in ("AND", "OR"):
+        rows = db.execute(
+            text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match ORDER BY rank LIMIT :limit"),
+            {"match": _fts_query(terms, operator), "limit": limit + len(seen)}
+        ).all()
+        ids = [row[0] for row in rows if row[0] not in seen]
+        if ids:
+            by_id = {product.id: product for product in db.scalars(select(ProductCatalog).where(ProductCatalog.id.in_(ids)))}
+            products.extend(by_id[product_id] for product_id in ids if product_id in by_id)
+            seen.update(ids)
+        if len(products) >= limit or len(terms) == 1:
+            break
+
+    return products[:limit]
+
+
+def _search_like(db: Session, query: str, limit: int) -> List[ProductCatalog]:
+    """
+    Unindexed fallback: ILIKE candidates re-ranked with the matcher similarity
+    """
+    search_term = f"%{query}%"
+    products = list(db.scalars(
+        select(ProductCatalog).where(or_(
+            ProductCatalog.description.ilike(search_term),
+            ProductCatalog.type.ilike(search_term),
+            ProductCatalog.material.ilike(search_term),
+            ProductCatalog.size.ilike(search_term),
+            ProductCatalog.length.ilike(search_term)
+        )).limit(limit * 20)
+    ))
+
+    preprocessed_query = preprocess_text(query)
+    products.sort(key=lambda product: calculate_similarity(preprocessed_query, product.description), reverse=True)
+    return products[:limit]
+
+
+def search_products(db: Session, query: str, limit: int) -> List[ProductCatalog]:
+    """
+    Return up to `limit` catalog products most similar to the query
+    """
+    query = query.strip()
+    if not query or limit <= 0:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return _search_postgresql(db, query, limit)
+    if dialect == "sqlite":
+        return _search_sqlite(db, query, limit)
+    return _search_like(db, query, limit)
+
+
+def search_products_batch(db: Session, queries: List[Tuple[str, int]]) -> List[List[ProductCatalog]]:
+    """
+    Search many (query, limit) pairs at once
+    All queries are scored together against the resident catalog index with
+    the TF-IDF matrix and the hits are loaded with a single query; catalog
+    rows that are not in the database yet are left out. The ranking is the
+    one the matchers use (TF-IDF cosine similarity), so it can differ from
+    search_products, which ranks with FTS5 bm25 or pg_trgm in the database.
+    """
+    results: List[List[ProductCatalog]] = [[] for _ in queries]
+    texts = [(position, query.strip(), limit) for position, (query, limit) in enumerate(queries)]
+    texts = [(position, query, limit) for position, query, limit in texts if query and limit > 0]
+    if not texts:
+        return results
+
+    # Only rows with a product id can be returned, so only those are ranked
+    index = get_catalog_index()
+    id_rows = [row for row, product_id in enumerate(index.product_ids) if product_id is not None]
+    if not id_rows:
+        return results
+
+    max_limit = max(limit for _, _, limit in texts)
+    top_matches = get_tfidf_matrix(index).top_n(
+        [preprocess_text(query) for _, query, _ in texts],
+        max_limit,
+        rows=id_rows if len(id_rows) < len(index) else None
+    )
+
+    hits = []
+    for (position, _, limit), matches in zip(texts, top_matches):
+        hits.append((position, [index.product_ids[row] for row, score in matches[:limit] if score > 0]))
+
+    wanted = {product_id for _, product_ids in hits for product_id in product_ids}
+    if not wanted:
+        return results
+    products = {product.id: product for product in db.scalars(select(ProductCatalog).where(ProductCatalog.id.in_(wanted)))}
+
+    for position, product_ids in hits:
+        results[position] = [products[product_id] for product_id in product_ids if product_id in products]
+    return results
@@ -0,0 +1,217 @@
+"""
+Opt-in sampling profiler for single requests.
+
+With PROFILING_ENABLED set, a request carrying the header "X-Profile: 1" or
+the query parameter "profile=1" is profiled: while it runs, a background
+thread samples the Python stacks of all threads that used CPU since the
+previous sample, every PROFILE_SAMPLE_INTERVAL seconds, so work handed to
+the thread pool (sync routes, matching) is seen as well as the event loop.
+The samples are written to PROFILE_DIR as folded stacks
+("thread;frame;frame count" lines) that flamegraph.pl and speedscope render
+as a flame graph. Samples of other requests running at the same time are
+included; worker processes (matcher pool, process job executor) are not
+sampled.
+
+Without PROFILING_ENABLED the middleware is not installed at all; when it is
+installed, requests that do not ask for a profile only pay for a header check.
+"""
+
+import os
+import sys
+import re
+import time
+import threading
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Directory where profiles are written
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("app", "profiles"))
+
+# Seconds between two stack samples
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# Number of profiles kept; older ones are deleted
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+PROFILE_SUFFIX = ".folded"
+
+# Without per-thread CPU clocks, stacks ending in these modules are taken
+# as threads waiting for work
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _thread_cpu_time(thread_id: int) -> Optional[float]:
+    """
+    CPU seconds used by a thread, or None where the platform cannot tell
+    """
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except (AttributeError, OSError, OverflowError):
+        return None
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """
+    Thread counting the folded Python stacks of all other threads until stopped
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._cpu_times: Dict[int, Optional[float]] = {}
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        self._cpu_times = {thread_id: _thread_cpu_time(thread_id) for thread_id in sys._current_frames()}
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def _is_running(self, thread_id: int, frame: Any) -> bool:
+        """
+        Whether a thread used CPU since the previous sample
+        """
+        cpu_time = _thread_cpu_time(thread_id)
+        if cpu_time is None:
+            return os.path.basename(frame.f_code.co_filename) not in _IDLE_MODULES
+        previous = self._cpu_times.get(thread_id)
+        self._cpu_times[thread_id] = cpu_time
+        return previous is None or cpu_time > previous
+
+    def sample(self) -> None:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident or not self._is_running(thread_id, frame):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _profile_name(method: str, path: str) -> str:
+    """
+    File name of a new profile: time, method and path of the request
+    """
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:80] or "root"
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S_%f')}_{method}_{slug}{PROFILE_SUFFIX}"
+
+
+def _write_profile(name: str, content: str) -> None:
+    """
+    Store a profile and delete the oldest ones beyond PROFILE_KEEP
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as profile_file:
+        profile_file.write(content)
+
+    names = sorted(entry for entry in os.listdir(PROFILE_DIR) if entry.endswith(PROFILE_SUFFIX))
+    for old_name in names[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old_name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Stored profiles, newest first
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith(PROFILE_SUFFIX):
+            continue
+        stat = os.stat(os.path.join(PROFILE_DIR, name))
+        profiles.append({
+            "name": name,
+            "size": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+        })
+        if len(profiles) >= limit:
+            break
+    return profiles
+
+
+def get_profile_path(name: str) -> Optional[str]:
+    """
+    Path of a stored profile, or None for an unknown or invalid name
+    """
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def _profile_requested(scope: Dict[str, Any]) -> bool:
+    """
+    Whether a request asks to be profiled by header or query parameter
+    """
+    for header, value in scope["headers"]:
+        if header == b"x-profile":
+            return value.strip().lower() in (b"1", b"true")
+    if b"profile=" in scope.get("query_string", b""):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [])
+        return any(value.lower() in ("1", "true") for value in values)
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling the requests that ask for it; the profile name
+    is returned in the X-Profile-Name response header
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not _profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = _profile_name(scope["method"], scope["path"])
+
+        async def send_with_name(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-name", name.encode())]
+            await send(message)
+
+        sampler = StackSampler()
+        start_time = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            await run_in_threadpool(sampler.stop)
+            await run_in_threadpool(_write_profile, name, sampler.folded())
+            logger.info(
+                f"Profiled {scope['method']} {scope['path']} in {time.perf_counter() - start_time:.3f} seconds "
+                f"({sum(sampler.samples.values())} samples): {name}"
+            )
@@ -0,0 +1,189 @@
+"""
+Vectorized matching of line items to the product catalog.
+
+Catalog descriptions are turned into a sparse character-trigram TF-IDF matrix
+once per catalog index. A whole batch of line item descriptions is then scored
+with a single sparse matrix multiply and the top N products are selected with
+argpartition, instead of running SequenceMatcher against every product.
+"""
+
+import math
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.catalog_index import CatalogIndex, get_catalog_index, preprocess_text
+
+# Size of the character n-grams
+NGRAM_SIZE = 3
+
+# Number of descriptions scored per matrix multiply, bounds the dense score block
+BATCH_SIZE = 64
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """
+    Count the character n-grams of a preprocessed string.
+    The string is padded with spaces so word boundaries form n-grams too.
+    """
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(max(len(padded) - n + 1, 0)))
+
+
+class TfidfMatrix:
+    """
+    Sparse, L2-normalized char-n-gram TF-IDF matrix of catalog descriptions
+    """
+
+    def __init__(self, normalized_descriptions: List[str]):
+        self.vocabulary: Dict[str, int] = {}
+        indptr = [0]
+        indices = []
+        data = []
+
+        for text in normalized_descriptions:
+            for gram, count in char_ngrams(text).items():
+                indices.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                data.append(count)
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(normalized_descriptions), len(self.vocabulary))
+        )
+
+        # Smoothed inverse document frequency, as in the usual TF-IDF definition
+        n_documents = counts.shape[0]
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        self.idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+
+        # Sublinear term frequency keeps repeated n-grams from dominating
+        counts.data = 1 + np.log(counts.data)
+        self.matrix = _l2_normalize(counts.multiply(self.idf).tocsr())
+
+        # Products as columns so a batch of queries is a single multiply
+        self.matrix_t = self.matrix.T.tocsr()
+
+    def transform(self, normalized_queries: List[str]) -> sparse.csr_matrix:
+        """
+        Vectorize preprocessed queries with the catalog vocabulary and IDF.
+        N-grams that never occur in the catalog are ignored.
+        """
+        indptr = [0]
+        indices = []
+        data = []
+
+        for text in normalized_queries:
+            for gram, count in char_ngrams(text).items():
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    indices.append(column)
+                    data.append((1 + math.log(count)) * self.idf[column])
+            indptr.append(len(indices))
+
+        queries = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(normalized_queries), len(self.vocabulary))
+        )
+        return _l2_normalize(queries)
+
+    def top_n(
+        self,
+        normalized_queries: List[str],
+        top_n: int,
+        rows: Optional[Sequence[int]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Return the top N (row, cosine similarity) pairs for every query,
+        best first, ties broken by catalog order. rows (ascending) limits
+        the candidates to those catalog rows
+        """
+        candidates = None if rows is None else np.asarray(rows, dtype=np.int64)
+        n_candidates = self.matrix.shape[0] if candidates is None else len(candidates)
+        k = min(top_n, n_candidates)
+        results = []
+        if k <= 0:
+            return [[] for _ in normalized_queries]
+
+        for start in range(0, len(normalized_queries), BATCH_SIZE):
+            queries = self.transform(normalized_queries[start:start + BATCH_SIZE])
+            scores = (queries @ self.matrix_t).toarray()
+            if candidates is not None:
+                scores = scores[:, candidates]
+
+            if k < n_candidates:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(n_candidates), (scores.shape[0], 1))
+
+            for row_scores, columns in zip(scores, top):
+                # argpartition gives no order; sort by score then catalog position
+                ordered = sorted(columns.tolist(), key=lambda column: (-row_scores[column], column))
+                results.append([
+                    (column if candidates is None else int(candidates[column]), float(row_scores[column]))
+                    for column in ordered
+                ])
+
+        return results
+
+
+def _l2_normalize(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    """
+    Scale every row of a sparse matrix to unit length (empty rows stay empty)
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+_matrix_lock = threading.Lock()
+
+
+def get_tfidf_matrix(index: CatalogIndex) -> TfidfMatrix:
+    """
+    Return the TF-IDF matrix of a catalog index, building it on first use.
+    The matrix is stored on the index so it is rebuilt together with it.
+    """
+    matrix = getattr(index, "tfidf_matrix", None)
+    if matrix is None:
+        with _matrix_lock:
+            matrix = getattr(index, "tfidf_matrix", None)
+            if matrix is None:
+                matrix = TfidfMatrix(index.normalized)
+                index.tfidf_matrix = matrix
+    return matrix
+
+
+def match_line_items_tfidf(
+    descriptions: List[str],
+    top_n: int = 5,
+    catalog_index: Optional[CatalogIndex] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Match line item descriptions to products in catalog with TF-IDF cosine similarity
+    Returns top N matches for each description, scores between 0-100
+    """
+    index = catalog_index if catalog_index is not None else get_catalog_index()
+
+    if not len(index):
+        print("Product catalog is empty or CSV file not found")
+        return {}
+
+    # Skip empty descriptions and score each distinct description once
+    queries = list(dict.fromkeys(description for description in descriptions if description))
+    if not queries:
+        return {}
+
+    matrix = get_tfidf_matrix(index)
+    top_matches = matrix.top_n([preprocess_text(query) for query in queries], top_n)
+
+    return {
+        query: [
+            {"match": index.descriptions[row], "score": score * 100}
+            for row, score in matches
+        ]
+        for query, matches in zip(queries, top_matches)
+    }
@@ -0,0 +1,187 @@
+"""
+Streaming storage of uploaded PDF files.
+
+Uploads are copied to a temporary file next to their final location in
+fixed-size chunks, hashed with SHA-256 on the way and fsynced, so memory use
+does not depend on the file size and a file is only moved into place once it
+is completely on disk. PDFs inside uploaded ZIP archives are unpacked the
+same way.
+"""
+
+import os
+import uuid
+import zipfile
+import hashlib
+import logging
+from typing import BinaryIO, List, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Uploads are read and written in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Largest accepted upload in bytes
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+
+# Largest accepted ZIP archive in bytes (each PDF in it is held to MAX_UPLOAD_SIZE)
+MAX_ARCHIVE_SIZE = int(os.getenv("MAX_ARCHIVE_SIZE", str(500 * 1024 * 1024)))
+
+
+class UploadTooLargeError(Exception):
+    """
+    Raised when an upload exceeds MAX_UPLOAD_SIZE
+    """
+
+
+def _fsync_directory(directory: str) -> None:
+    """
+    Flush a directory entry (a rename) to disk
+    """
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def _remove_quietly(path: str) -> None:
+    """
+    Remove a file, ignoring a file that is already gone
+    """
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_upload_to_disk(
+    file: UploadFile,
+    directory: str,
+    max_size: int = MAX_UPLOAD_SIZE
+) -> Tuple[str, str, int]:
+    """
+    Stream an upload into a temporary file in `directory`, hashing it on the way
+    Returns (temporary path, SHA-256 hex digest, size in bytes) once the file
+    is fsynced; the temporary file is removed if anything fails
+    """
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as temp_file:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"File is larger than the {max_size} byte upload limit")
+                digest.update(chunk)
+                await temp_file.write(chunk)
+
+            await temp_file.flush()
+            await run_in_threadpool(os.fsync, temp_file.fileno())
+    except BaseException:
+        await _remove_quietly(temp_path)
+        raise
+
+    return temp_path, digest.hexdigest(), size
+
+
+async def move_upload_into_place(temp_path: str, file_path: str) -> None:
+    """
+    Atomically move a streamed upload to its final path and make the rename durable
+    """
+    await aiofiles.os.replace(temp_path, file_path)
+    await run_in_threadpool(_fsync_directory, os.path.dirname(file_path) or ".")
+
+
+async def discard_upload(*paths: str) -> None:
+    """
+    Remove the files of an upload that could not be recorded
+    """
+    for path in paths:
+        if path:
+            await _remove_quietly(path)
+
+
+def _copy_to_disk(source: BinaryIO, directory: str, max_size: int) -> Tuple[str, str, int]:
+    """
+    Blocking counterpart of stream_upload_to_disk for file objects
+    """
+    temp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(temp_path, "wb") as temp_file:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"File is larger than the {max_size} byte upload limit")
+                digest.update(chunk)
+                temp_file.write(chunk)
+
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return temp_path, digest.hexdigest(), size
+
+
+def unpack_pdfs_from_zip(
+    archive_path: str,
+    directory: str,
+    max_size: int = MAX_UPLOAD_SIZE
+) -> Tuple[List[Tuple[str, str, str, int]], List[str]]:
+    """
+    Stream each PDF member of a ZIP archive into a temporary file in `directory`
+    Returns ([(member name, temporary path, SHA-256, size)], rejected member
+    names); members are decompressed in chunks and held to max_size, so the
+    archive's declared sizes are not trusted. Blocking; run in a thread
+    """
+    unpacked: List[Tuple[str, str, str, int]] = []
+    rejected: List[str] = []
+
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or os.path.basename(name).startswith(".") or name.startswith("__MACOSX/"):
+                    continue
+                if not name.lower().endswith(".pdf"):
+                    rejected.append(name)
+                    continue
+                try:
+                    with archive.open(member) as source:
+                        temp_path, sha256, size = _copy_to_disk(source, directory, max_size)
+                except UploadTooLargeError:
+                    logger.warning(f"Skipped oversized archive member {name}")
+                    rejected.append(name)
+                    continue
+                unpacked.append((os.path.basename(name), temp_path, sha256, size))
+    except BaseException:
+        for _, temp_path, _, _ in unpacked:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+        raise
+
+    return unpacked, rejected
@@ -93,6 +93,135 @@ def run_migration():
             else:
                 print(f"Column '{column}' already exists, no migration needed.")
         
+        # Check if table_data column exists in documents
+        print("Checking if 'table_data' column exists in 'documents' table...")
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'documents' AND column_name = 'table_data';
+        """)
+        
+        if cursor.fetchone() is None:
+            print("Adding 'table_data' column to 'documents' table...")
+            cursor.execute("""
+                ALTER TABLE documents 
+                ADD COLUMN table_data JSON;
+            """)
+            print("Column 'table_data' added successfully!")
+        else:
+            print("Column 'table_data' already exists, no migration needed.")
+        
+        # Check if the upload hash and size columns exist in documents
+        for column, column_type in (("sha256", "VARCHAR(64)"), ("file_size", "INTEGER")):
+            print(f"Checking if '{column}' column exists in 'documents' table...")
+            cursor.execute(f"""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'documents' AND column_name = '{column}';
+            """)
+            
+            if cursor.fetchone() is None:
+                print(f"Adding '{column}' column to 'documents' table...")
+                cursor.execute(f"""
+                    ALTER TABLE documents 
+                    ADD COLUMN {column} {column_type};
+                """)
+                print(f"Column '{column}' added successfully!")
+            else:
+                print(f"Column '{column}' already exists, no migration needed.")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_sha256 ON documents (sha256);")
+        
+        # Trigram index for the product search
+        print("Creating trigram index on 'product_catalog.description'...")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_product_catalog_description_trgm
+            ON product_catalog USING gin (description gin_trgm_ops);
+        """)
+        print("Trigram index is in place.")
+        
+        # Foreign key index used by the document listing counts
+        print("Creating foreign key index on 'line_items'...")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_line_items_document_id ON line_items (document_id);")
+        print("Foreign key index is in place.")
+        
+        # Compact duplicate matches left by repeated matching, keeping the
+        # selected or best-scored row, then make the pair unique
+        print("Removing duplicate rows from 'product_matches'...")
+        cursor.execute("""
+            DELETE FROM product_matches WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY line_item_id, product_id
+                        ORDER BY is_selected DESC NULLS LAST, score DESC NULLS LAST, id
+                    ) AS position
+                    FROM product_matches
+                ) ranked
+                WHERE position > 1
+            );
+        """)
+        print(f"Removed {cursor.rowcount} duplicate matches.")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_product_matches_line_item_product
+            ON product_matches (line_item_id, product_id);
+        """)
+        print("Unique index on (line_item_id, product_id) is in place.")
+        
+        # Content-addressed storage: reference-count the hashed documents and
+        # move their per-document files into the blob tree
+        print("Creating 'blobs' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 VARCHAR(64) PRIMARY KEY,
+                size INTEGER,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                extraction_cache_hits INTEGER NOT NULL DEFAULT 0,
+                extraction_cache_misses INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT now()
+            );
+        """)
+        cursor.execute("""
+            INSERT INTO blobs (sha256, size, ref_count)
+            SELECT sha256, MAX(file_size), COUNT(*) FROM documents
+            WHERE sha256 IS NOT NULL
+            GROUP BY sha256
+            ON CONFLICT (sha256) DO NOTHING;
+        """)
+        print(f"Added {cursor.rowcount} blobs.")
+        
+        from app.services.blob_store import blob_path
+        cursor.execute("SELECT id, sha256 FROM documents WHERE sha256 IS NOT NULL;")
+        for document_id, sha256 in cursor.fetchall():
+            legacy_path = os.path.join("app", "uploads", f"document_{document_id}.pdf")
+            if not os.path.exists(legacy_path):
+                continue
+            path = blob_path(sha256)
+            if os.path.exists(path):
+                os.remove(legacy_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(legacy_path, path)
+        print("Hashed documents are in the blob store.")
+        
+        # Batch uploads group their documents' jobs
+        print("Creating 'batches' table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                id SERIAL PRIMARY KEY,
+                status VARCHAR NOT NULL DEFAULT 'queued',
+                rejected JSON,
+                created_at TIMESTAMP DEFAULT now(),
+                finished_at TIMESTAMP
+            );
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_batches_id ON batches (id);")
+        cursor.execute("ALTER TABLE batches ADD COLUMN IF NOT EXISTS rejected JSON;")
+        cursor.execute("SELECT to_regclass('jobs');")
+        if cursor.fetchone()[0] is not None:
+            cursor.execute("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS batch_id INTEGER REFERENCES batches (id);")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_jobs_batch_id ON jobs (batch_id);")
+        print("Batch tables are in place.")
+        
         # Commit changes
         conn.commit()
         print("Migration completed successfully!")
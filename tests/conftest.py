@@ -0,0 +1,43 @@
+import os
+import sys
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The OpenAI client is created at import time; tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from app.db.database import Base
+from app.models import models  # noqa: F401 - register the models on Base
+
+@pytest.fixture
+def db():
+    """In-memory SQLite session with all tables created"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+@pytest.fixture
+def count_queries(db):
+    """Return a callable giving the number of SQL statements executed so far"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(db.get_bind(), "before_cursor_execute", before_cursor_execute)
+    yield lambda: len(statements)
+    event.remove(db.get_bind(), "before_cursor_execute", before_cursor_execute)
@@ -0,0 +1,119 @@
+import os
+import sys
+import asyncio
+import pytest
+from unittest.mock import patch
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.database import Base
+from app.models.models import Blob
+from app.services.blob_store import (
+    add_blob_reference,
+    store_blob,
+    settle_blob,
+    release_blob,
+    drop_blob,
+    delete_blob_file,
+    record_extraction,
+    get_blob_stats,
+    blob_path
+)
+
+SHA256 = "ab" * 32
+
+@pytest.fixture
+def blob_dir(tmp_path):
+    with patch("app.services.blob_store.BLOB_STORE_DIR", str(tmp_path)):
+        yield tmp_path
+
+def _upload(directory, name, content=b"%PDF-1.4 purchase order"):
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+def test_store_blob_deduplicates_and_release_deletes_last_copy(db, blob_dir):
+    """Test that identical uploads share one sharded file that lives as long as its documents"""
+    first, second = _upload(blob_dir, "first.part"), _upload(blob_dir, "second.part")
+    add_blob_reference(db, SHA256, 23)
+    assert asyncio.run(store_blob(first, SHA256))
+    add_blob_reference(db, SHA256, 23)
+    assert not asyncio.run(store_blob(second, SHA256))
+    db.commit()
+    # The duplicate is kept until the reference is committed
+    assert os.path.exists(second)
+    asyncio.run(settle_blob(second, SHA256))
+
+    path = blob_path(SHA256)
+    assert path == os.path.join(str(blob_dir), "ab", "ab", f"{SHA256}.pdf")
+    assert os.path.exists(path)
+    assert not os.path.exists(first)
+    assert not os.path.exists(second)
+    assert db.get(Blob, SHA256).ref_count == 2
+
+    assert not release_blob(db, SHA256)
+    assert release_blob(db, SHA256)
+    # The file outlives a release that is rolled back
+    db.rollback()
+    assert os.path.exists(path)
+    assert db.get(Blob, SHA256).ref_count == 2
+
+    release_blob(db, SHA256)
+    assert release_blob(db, SHA256)
+    db.commit()
+    assert os.path.exists(path)
+    assert drop_blob(db, SHA256)
+    db.commit()
+    assert db.get(Blob, SHA256) is None
+    assert not release_blob(db, SHA256)
+
+def test_delete_blob_file_keeps_file_referenced_again(blob_dir, tmp_path):
+    """Test that a file released and then uploaded again before its deletion is kept"""
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'blobs.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        path = blob_path(SHA256)
+
+        async with sessions() as db:
+            await db.run_sync(add_blob_reference, SHA256, 23)
+            await store_blob(_upload(blob_dir, "first.part"), SHA256)
+            await db.commit()
+            assert await db.run_sync(release_blob, SHA256)
+            await db.commit()
+
+            # An upload of the same bytes commits before the file is deleted
+            async with sessions() as upload_db:
+                await upload_db.run_sync(add_blob_reference, SHA256, 23)
+                duplicate = _upload(blob_dir, "second.part")
+                assert not await store_blob(duplicate, SHA256)
+                await upload_db.commit()
+                await settle_blob(duplicate, SHA256)
+
+            assert not await delete_blob_file(db, SHA256)
+            assert os.path.exists(path)
+
+            assert await db.run_sync(release_blob, SHA256)
+            await db.commit()
+            assert await delete_blob_file(db, SHA256)
+            assert not os.path.exists(path)
+            assert await db.get(Blob, SHA256) is None
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_record_extraction_hit_rate(db, blob_dir):
+    """Test that cache hits and OpenAI extractions are counted per blob"""
+    add_blob_reference(db, SHA256, 23)
+    for source in ("openai", "cache", "cache", "local", "error", "cache"):
+        record_extraction(db, SHA256, source)
+    db.commit()
+
+    stats = get_blob_stats(db, SHA256)
+    assert (stats["extraction_cache_hits"], stats["extraction_cache_misses"]) == (3, 1)
+    assert stats["hit_rate"] == 0.75
+    assert get_blob_stats(db, "cd" * 32) is None
@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import ProductCatalog
+from app.services.catalog_import import import_catalog_csv
+
+CSV_HEADER = "Type,Material,Size,Length,Coating,Thread Type,Description\n"
+
+def test_import_catalog_csv_skips_existing_and_duplicates(db, tmp_path):
+    """Test that the batched import inserts new descriptions once and counts the rest as skipped"""
+    db.add(ProductCatalog(type="Bolt", description="Steel Bolt M4 10mm Zinc Plated Coarse"))
+    db.commit()
+
+    csv_file = tmp_path / "catalog.csv"
+    lines = [f"Bolt,Steel,M4,{i}mm,Zinc Plated,Coarse,Steel Bolt M4 {i}mm Zinc Plated Coarse\n" for i in range(10, 35)]
+    lines.append(lines[3])  # duplicate within the file
+    lines.append("Nut,Brass,M6,,Plain,Fine,\n")  # no description
+    csv_file.write_text(CSV_HEADER + "".join(lines))
+
+    result = import_catalog_csv(db, str(csv_file), batch_size=10)
+
+    assert result["rows"] == 27
+    assert result["imported"] == 24
+    assert result["skipped"] == 3
+    assert result["rows_per_second"] > 0
+
+    products = db.query(ProductCatalog).order_by(ProductCatalog.id).all()
+    assert len(products) == 25
+    assert products[1].description == "Steel Bolt M4 11mm Zinc Plated Coarse"
+    assert products[1].thread_type == "Coarse"
+
+    # Importing again adds nothing
+    assert import_catalog_csv(db, str(csv_file))["imported"] == 0
@@ -10,8 +10,10 @@ from app.services.custom_matcher import (
     preprocess_text, 
     calculate_similarity,
     load_product_catalog,
-    match_line_items_custom
+    match_line_items_custom,
+    score_description
 )
+from app.services.catalog_index import CatalogIndex, get_catalog_index, invalidate_catalog_index, preprocess_text
 
 def test_preprocess_text():
     """Test text preprocessing function"""
@@ -57,9 +59,8 @@ def test_load_product_catalog():
         assert catalog[0]["Description"] == "Steel Bolt M4 10mm Zinc Plated Coarse"
         assert catalog[1]["Type"] == "Bolt"
 
-@patch("os.path.exists", return_value=True)
-@patch("app.services.custom_matcher.load_product_catalog")
-def test_match_line_items_custom(mock_load_catalog, mock_exists):
+@patch("app.services.custom_matcher.get_catalog_index")
+def test_match_line_items_custom(mock_get_index):
     """Test custom matching function"""
     # Mock catalog
     mock_catalog = [
@@ -67,7 +68,7 @@ def test_match_line_items_custom(mock_load_catalog, mock_exists):
         {"Description": "Steel Bolt M4 10mm Zinc Plated Fine"},
         {"Description": "Aluminum Screw M5 20mm Uncoated Fine"}
     ]
-    mock_load_catalog.return_value = mock_catalog
+    mock_get_index.return_value = CatalogIndex(mock_catalog)
     
     # Test matching
     descriptions = ["Steel Bolt M4", "Aluminum Screw"]
@@ -82,4 +83,131 @@ def test_match_line_items_custom(mock_load_catalog, mock_exists):
     
     # Check if match contains correct fields
     assert "match" in results["Steel Bolt M4"][0]
-    assert "score" in results["Steel Bolt M4"][0] 
\ No newline at end of file
+    assert "score" in results["Steel Bolt M4"][0] 
+
+def test_catalog_index_normalizes_descriptions():
+    """Test that the catalog index stores preprocessed descriptions"""
+    index = CatalogIndex([{"Description": "Steel Bolt M4-10mm, Zinc Plated"}])
+    
+    assert len(index) == 1
+    assert index.descriptions[0] == "Steel Bolt M4-10mm, Zinc Plated"
+    assert index.normalized[0] == "steel bolt m4 10mm zinc plated"
+
+def test_catalog_index_reloads_when_csv_changes(tmp_path):
+    """Test that the resident index is reused until the CSV file changes"""
+    csv_path = tmp_path / "catalog.csv"
+    csv_path.write_text("Type,Description\nBolt,Steel Bolt M4\n")
+    
+    with patch("app.services.catalog_index._catalog_table_signature", return_value=None):
+        first = get_catalog_index(str(csv_path), force=True)
+        assert get_catalog_index(str(csv_path)) is first
+        
+        csv_path.write_text("Type,Description\nBolt,Steel Bolt M4\nNut,Brass Nut M5\n")
+        os.utime(csv_path, ns=(0, 0))
+        
+        # Bypass the check interval so the change is picked up immediately
+        invalidate_catalog_index()
+        reloaded = get_catalog_index(str(csv_path))
+        assert reloaded is not first
+        assert reloaded.descriptions == ["Steel Bolt M4", "Brass Nut M5"]
+
+def test_catalog_index_blocks_candidates_by_attributes():
+    """Test that parsed attributes restrict the candidate products"""
+    index = CatalogIndex([
+        {"Type": "Bolt", "Material": "Steel", "Size": "M4", "Coating": "Zinc Plated", "Description": "Steel Bolt M4 Zinc Plated"},
+        {"Type": "Bolt", "Material": "Stainless Steel", "Size": "M4", "Coating": "Uncoated", "Description": "Stainless Steel Bolt M4 Uncoated"},
+        {"Type": "Nut", "Material": "Steel", "Size": "M5", "Coating": "Zinc Plated", "Description": "Steel Nut M5 Zinc Plated"},
+    ])
+    
+    # "stainless" refers to "stainless steel" and must not also count as "steel"
+    assert index.parse_attributes("stainless bolts m4") == {
+        "Material": {"stainless steel"},
+        "Type": {"bolt"},
+        "Size": {"m4"},
+    }
+    assert index.candidate_indices("stainless bolts m4") == [1]
+    assert index.candidate_indices("m4 zinc plated bolt") == [0]
+    
+    # Without a product sharing every attribute, those sharing the most are kept
+    assert index.candidate_indices("steel nut m4") == [0, 2]
+    
+    # Products sharing fewer attributes are added up to the minimum
+    assert index.candidate_indices("stainless bolts m4", min_candidates=2) == [0, 1]
+    
+    # Nothing parsed means a full scan
+    assert index.candidate_indices("widget") is None
+
+def test_match_line_items_tfidf_engine():
+    """Test that the TF-IDF engine returns the same result shape, best match first"""
+    index = CatalogIndex([
+        {"Description": "Steel Bolt M4 10mm Zinc Plated Coarse"},
+        {"Description": "Brass Nut M8 Uncoated Fine"},
+        {"Description": "Aluminum Screw M5 20mm Uncoated Fine"}
+    ])
+    
+    results = match_line_items_custom(["Aluminum Screw M5", "", "brass nut"], top_n=2, catalog_index=index, engine="tfidf")
+    
+    assert list(results) == ["Aluminum Screw M5", "brass nut"]
+    assert len(results["Aluminum Screw M5"]) == 2
+    assert results["Aluminum Screw M5"][0]["match"] == "Aluminum Screw M5 20mm Uncoated Fine"
+    assert results["brass nut"][0]["match"] == "Brass Nut M8 Uncoated Fine"
+    assert results["brass nut"][0]["score"] > results["brass nut"][1]["score"]
+    assert 0 <= results["brass nut"][1]["score"] <= 100
+    
+    with pytest.raises(ValueError):
+        match_line_items_custom(["brass nut"], catalog_index=index, engine="unknown")
+
+def test_score_description_shards_merge_to_full_result():
+    """Test that merging per-shard top N lists gives the unsharded top N"""
+    index = CatalogIndex([
+        {"Description": f"Steel Bolt M{size} {length}mm Zinc Plated"}
+        for size in (4, 5, 6) for length in (10, 20, 30)
+    ])
+    
+    full = score_description(index, "steel bolt m5 20mm", top_n=4, blocking=False)
+    shards = [
+        match
+        for shard_id in range(3)
+        for match in score_description(index, "steel bolt m5 20mm", top_n=4, blocking=False, shard=(shard_id, 3))
+    ]
+    merged = sorted(shards, key=lambda match: (-match[0], match[1]))[:4]
+    
+    assert merged == full
+    assert index.descriptions[full[0][1]] == "Steel Bolt M5 20mm Zinc Plated"
+
+def test_score_description_matches_full_sort():
+    """Test that the bounded heap with ratio cutoffs returns the full-sort top N"""
+    descriptions = [
+        f"{material} {kind} {size} {length}mm {coating}"
+        for material in ("Steel", "Brass") for kind in ("Bolt", "Nut")
+        for size in ("M4", "M5") for length in (10, 100)
+        for coating in ("Zinc Plated", "Uncoated")
+    ]
+    index = CatalogIndex([{"Description": description} for description in descriptions])
+    
+    for query in ("steel bolt m4 10mm", "brass nut uncoated", "zzz"):
+        expected = sorted(
+            ((calculate_similarity(query, description), row) for row, description in enumerate(descriptions)),
+            key=lambda match: match[0],
+            reverse=True
+        )
+        for top_n in (1, 3, 7):
+            assert score_description(index, query, top_n=top_n, blocking=False) == expected[:top_n]
+
+def test_blocking_keeps_full_scan_alternatives():
+    """Test that blocked scoring returns the same top N as a full scan, not just the same best match"""
+    attributes = [
+        {"Type": kind, "Material": material, "Size": size, "Length": length, "Coating": coating,
+         "Description": f'{material} {kind} {size} {length} {coating} Coarse'}
+        for material in ("Steel", "Brass") for kind in ("Bolt", "Nut")
+        for size in ('1/2"', "M12") for length in ("10mm", "20mm") for coating in ("Galvanized", "Zinc Plated")
+    ]
+    index = CatalogIndex(attributes)
+    
+    query = 'Brass Nut 1/2" 20mm Galvanized Coarse'
+    # Even with no extra candidates the products one attribute away are scored
+    with patch("app.services.custom_matcher.BLOCKING_MIN_CANDIDATES", 3):
+        blocked = score_description(index, query, top_n=3)
+    assert blocked == score_description(index, query, top_n=3, blocking=False)
+    assert index.descriptions[blocked[2][1]] == 'Brass Nut M12 20mm Galvanized Coarse'
+    assert len(index.candidate_indices(preprocess_text(query), min_candidates=3)) < len(index)
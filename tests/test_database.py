@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import async_database_url, pool_options, DB_POOL_SIZE
+
+def test_async_database_url():
+    """Test that sync URLs map to their async drivers"""
+    assert async_database_url("postgresql://u:p@localhost:5432/db") == "postgresql+asyncpg://u:p@localhost:5432/db"
+    assert async_database_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert async_database_url("sqlite:////tmp/app.db") == "sqlite+aiosqlite:////tmp/app.db"
+    assert async_database_url("postgresql+asyncpg://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+
+def test_pool_options():
+    """Test that pool limits apply to server databases only"""
+    assert pool_options("sqlite:////tmp/app.db") == {}
+    options = pool_options("postgresql+asyncpg://u:p@db/app")
+    assert options["pool_size"] == DB_POOL_SIZE
+    assert {"max_overflow", "pool_timeout"} <= set(options)
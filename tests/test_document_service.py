@@ -0,0 +1,198 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+from sqlalchemy import text
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import Document, LineItem, ProductCatalog, ProductMatch
+from app.schemas.schemas import Document as DocumentSchema
+from app.services.document_service import (
+    save_extracted_items,
+    match_and_save_line_items,
+    list_document_summaries,
+    get_document_with_matches,
+    ensure_unique_product_matches,
+    PRODUCT_MATCH_UNIQUE_INDEX
+)
+
+def test_save_extracted_items_bulk_insert(db):
+    """Test that bulk-inserted line items get the ids of their own rows"""
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.commit()
+    
+    extracted_content = [{"description": "TABLE_STRUCTURE", "quantity": 1, "table_data": {"rows": []}}]
+    extracted_content += [{"description": f"Steel Bolt M4 {i}0mm", "quantity": i} for i in range(1, 51)]
+    extracted_content.append({"quantity": 3})  # no description, skipped
+    
+    items = save_extracted_items(db, document, extracted_content)
+    db.commit()
+    
+    assert items[0]["description"] == "TABLE_STRUCTURE"
+    assert len(items) == 51
+    
+    # Returned ids belong to the rows with the same description
+    stored = {item.id: item for item in db.query(LineItem).all()}
+    for item in items[1:]:
+        assert stored[item["id"]].description == item["description"]
+        assert stored[item["id"]].quantity == item["quantity"]
+    
+    # The extracted table is stored on the document
+    db.expire_all()
+    assert db.get(Document, document.id).table_data == {"rows": []}
+
+def test_match_and_save_line_items_query_count(db, count_queries):
+    """Test that match persistence does not issue queries per line item or match"""
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.add(ProductCatalog(description="Steel Bolt M4 10mm Zinc Plated Coarse"))
+    db.commit()
+    line_items = [LineItem(document_id=document.id, description=f"bolt {i}", quantity=1) for i in range(20)]
+    db.add_all(line_items)
+    db.commit()
+    line_items = db.query(LineItem).order_by(LineItem.id).all()
+    
+    matching_results = {
+        f"bolt {i}": [
+            {"match": "Steel Bolt M4 10mm Zinc Plated Coarse", "score": 90.0},
+            {"match": f"New Product {i}", "score": 50.0}
+        ]
+        for i in range(20)
+    }
+    
+    with patch("app.services.document_service.match_line_items", return_value=matching_results):
+        before = count_queries()
+        items = match_and_save_line_items(db, line_items)
+        queries = count_queries() - before
+    db.commit()
+    
+    # One lookup, one insert of missing products, one delete of previous
+    # matches, one upsert of matches
+    assert queries == 4
+    
+    products = {product.description: product.id for product in db.query(ProductCatalog).all()}
+    assert len(products) == 21
+    assert items[3]["matches"][0]["product_id"] == products["Steel Bolt M4 10mm Zinc Plated Coarse"]
+    assert items[3]["matches"][1]["product_id"] == products["New Product 3"]
+    assert db.query(ProductMatch).count() == 40
+
+def test_match_and_save_line_items_is_idempotent(db):
+    """Test that re-matching replaces matches and keeps the user's selection"""
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.add_all([ProductCatalog(description=f"Steel Bolt M4 {i}0mm") for i in range(1, 4)])
+    db.commit()
+    db.add(LineItem(document_id=document.id, description="bolt", quantity=1))
+    db.commit()
+    line_items = db.query(LineItem).all()
+    
+    first = {"bolt": [
+        {"match": "Steel Bolt M4 10mm", "score": 90.0},
+        {"match": "Steel Bolt M4 20mm", "score": 80.0},
+        {"match": "Steel Bolt M4 20mm", "score": 70.0}  # duplicate catalog row
+    ]}
+    match_and_save_line_items(db, line_items, first)
+    db.commit()
+    assert db.query(ProductMatch).count() == 2
+    
+    # The user selects the second match
+    selected = db.query(ProductMatch).filter(ProductMatch.score == 80.0).one()
+    selected.is_selected = True
+    db.commit()
+    
+    second = {"bolt": [
+        {"match": "Steel Bolt M4 30mm", "score": 95.0},
+        {"match": "Steel Bolt M4 20mm", "score": 85.0}
+    ]}
+    for _ in range(3):
+        match_and_save_line_items(db, line_items, second)
+        db.commit()
+    
+    matches = {match.product.description: match for match in db.query(ProductMatch).all()}
+    assert set(matches) == {"Steel Bolt M4 30mm", "Steel Bolt M4 20mm"}
+    assert matches["Steel Bolt M4 20mm"].id == selected.id
+    assert matches["Steel Bolt M4 20mm"].is_selected
+    assert matches["Steel Bolt M4 20mm"].score == 85.0
+    assert not matches["Steel Bolt M4 30mm"].is_selected
+
+def test_list_document_summaries_keyset_pages(db, count_queries):
+    """Test that the listing pages by id with counts from a single query"""
+    product = ProductCatalog(description="Steel Bolt M4 10mm Zinc Plated Coarse")
+    other_product = ProductCatalog(description="Steel Bolt M4 20mm Zinc Plated Coarse")
+    db.add_all([product, other_product])
+    documents = [Document(filename=f"po_{i}.pdf") for i in range(5)]
+    db.add_all(documents)
+    db.flush()
+    for i, document in enumerate(documents):
+        db.add(LineItem(document_id=document.id, description="TABLE_STRUCTURE", quantity=1))
+        for j in range(i):
+            line_item = LineItem(document_id=document.id, description=f"bolt {j}", quantity=1)
+            db.add(line_item)
+            db.flush()
+            if j % 2 == 0:
+                # Two matches for the same line item count once
+                db.add(ProductMatch(line_item_id=line_item.id, product_id=product.id, score=90))
+                db.add(ProductMatch(line_item_id=line_item.id, product_id=other_product.id, score=80))
+    db.commit()
+    
+    start = count_queries()
+    page = list_document_summaries(db, limit=2)
+    assert count_queries() - start == 1
+    assert [(row["filename"], row["item_count"], row["matched_count"]) for row in page["documents"]] == [
+        ("po_4.pdf", 4, 2),
+        ("po_3.pdf", 3, 2),
+    ]
+    
+    page = list_document_summaries(db, limit=2, cursor=page["next_cursor"])
+    assert [row["filename"] for row in page["documents"]] == ["po_2.pdf", "po_1.pdf"]
+    
+    page = list_document_summaries(db, limit=2, cursor=page["next_cursor"])
+    assert [(row["filename"], row["item_count"], row["matched_count"]) for row in page["documents"]] == [("po_0.pdf", 0, 0)]
+    assert page["next_cursor"] is None
+
+@pytest.mark.parametrize("n_items", [2, 40])
+def test_get_document_with_matches_query_count(db, count_queries, n_items):
+    """Test that loading and serializing a document takes the same queries for any item count"""
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.flush()
+    for i in range(n_items):
+        product = ProductCatalog(description=f"Steel Bolt M4 {i}mm")
+        line_item = LineItem(document_id=document.id, description=f"bolt {i}", quantity=1)
+        db.add_all([product, line_item])
+        db.flush()
+        db.add(ProductMatch(line_item_id=line_item.id, product_id=product.id, score=90))
+    db.commit()
+    document_id = document.id
+    db.expunge_all()
+    
+    start = count_queries()
+    loaded = get_document_with_matches(db, document_id)
+    data = DocumentSchema.model_validate(loaded, from_attributes=True).model_dump()
+    
+    assert count_queries() - start == 4
+    assert len(data["items"]) == n_items
+    assert all(item["matches"][0]["product"]["description"] for item in data["items"])
+    assert get_document_with_matches(db, document_id + 1) is None
+
+def test_ensure_unique_product_matches_compacts_duplicates(db):
+    """Test that duplicates from before the unique index are compacted, keeping the selection"""
+    engine = db.get_bind()
+    db.execute(text(f"DROP INDEX {PRODUCT_MATCH_UNIQUE_INDEX}"))
+    db.add(ProductCatalog(id=1, description="Steel Bolt M4 10mm"))
+    db.add(LineItem(id=1, description="bolt", quantity=1))
+    db.add_all([
+        ProductMatch(line_item_id=1, product_id=1, score=90.0),
+        ProductMatch(line_item_id=1, product_id=1, score=70.0, is_selected=True),
+        ProductMatch(line_item_id=1, product_id=1, score=95.0),
+    ])
+    db.commit()
+    
+    assert ensure_unique_product_matches(engine) == 2
+    assert [(match.score, match.is_selected) for match in db.query(ProductMatch).all()] == [(70.0, True)]
+    
+    # The index is back, so a second run does nothing
+    assert ensure_unique_product_matches(engine) == 0
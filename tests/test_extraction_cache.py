@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import extraction_cache
+from app.services.extraction_cache import (
+    content_hash,
+    get_cached_extraction,
+    store_extraction,
+    purge_stale_entries,
+    get_cache_stats
+)
+from app.services.pdf_extraction_service import _parse_table_content
+
+ITEMS = [
+    {"description": "TABLE_STRUCTURE", "quantity": 1, "table_data": {"title": "PO", "columns": ["Item"], "rows": [["Bolt"]]}},
+    {"description": "Bolt", "quantity": 1}
+]
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path):
+    """Point the extraction cache at a temporary directory"""
+    with patch.object(extraction_cache, "EXTRACTION_CACHE_DIR", str(tmp_path)):
+        yield tmp_path
+
+def test_store_and_get_cached_extraction():
+    """Test that a stored extraction is returned for the same PDF, model and prompt"""
+    pdf_hash = content_hash(b"%PDF-1.4 test")
+    before = get_cache_stats()
+    
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "v1") is None
+    assert store_extraction(pdf_hash, "gpt-4.1", "v1", ITEMS)
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "v1") == ITEMS
+    
+    # Other models and prompt versions do not share entries
+    assert get_cached_extraction(pdf_hash, "gpt-4o", "v1") is None
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "v2") is None
+    
+    after = get_cache_stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 3
+
+def test_errors_are_not_cached():
+    """Test that failed extractions are not stored"""
+    pdf_hash = content_hash(b"%PDF-1.4 broken")
+    
+    assert not store_extraction(pdf_hash, "gpt-4.1", "v1", [{"description": "Error extracting text with OpenAI: timeout", "quantity": 1}])
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "v1") is None
+
+def test_unparsed_model_output_is_not_cached():
+    """Test that tables built from model output that was not JSON are not stored"""
+    pdf_hash = content_hash(b"%PDF-1.4 malformed")
+    
+    for content in ("Sorry, I cannot read this document", '{"rows": [["Bolt"]}'):
+        items = _parse_table_content(content)
+        assert items[0]["description"] == "TABLE_STRUCTURE"
+        assert not store_extraction(pdf_hash, "gpt-4.1", "v1", items)
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "v1") is None
+    
+    assert store_extraction(pdf_hash, "gpt-4.1", "v1", _parse_table_content('{"columns": ["Item"], "rows": [["Bolt"]]}'))
+
+def test_purge_stale_entries():
+    """Test that entries of other prompt versions are purged"""
+    pdf_hash = content_hash(b"%PDF-1.4 test")
+    store_extraction(pdf_hash, "gpt-4.1", "old", ITEMS)
+    store_extraction(pdf_hash, "gpt-4.1", "new", ITEMS)
+    
+    assert purge_stale_entries("new") == 1
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "old") is None
+    assert get_cached_extraction(pdf_hash, "gpt-4.1", "new") == ITEMS
@@ -0,0 +1,74 @@
+import os
+import sys
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.file_delivery import parse_range, serve_file
+
+CONTENT = bytes(range(256)) * 4
+SHA256 = "ab" * 32
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/pdf")
+    def pdf(request: Request):
+        return serve_file(request, str(path), "application/pdf", content_hash=SHA256)
+
+    return TestClient(app)
+
+def test_parse_range():
+    """Test byte range parsing against the file size"""
+    assert parse_range("bytes=0-99", 1024) == (0, 99)
+    assert parse_range("bytes=1000-", 1024) == (1000, 1023)
+    assert parse_range("bytes=-24", 1024) == (1000, 1023)
+    assert parse_range("bytes=1000-5000", 1024) == (1000, 1023)
+    assert parse_range("bytes=0-1,5-6", 1024) is None
+    assert parse_range("items=0-1", 1024) is None
+    assert parse_range("bytes=-2048", 1024) == (0, 1023)
+    # A last byte before the first makes the range invalid, so it is ignored
+    assert parse_range("bytes=5-3", 1024) is None
+    for header in ("bytes=2048-", "bytes=1024-1030", "bytes=-0"):
+        with pytest.raises(ValueError):
+            parse_range(header, 1024)
+
+def test_serve_file_validators_and_revalidation(client):
+    """Test that repeat requests with the ETag or date become 304s"""
+    response = client.get("/pdf")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{SHA256}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+    assert client.get("/pdf", headers={"If-None-Match": f'"other", W/"{SHA256}"'}).status_code == 304
+    assert client.get("/pdf", headers={"If-Modified-Since": response.headers["last-modified"]}).status_code == 304
+    # A stale ETag wins over a matching date
+    stale = {"If-None-Match": '"other"', "If-Modified-Since": response.headers["last-modified"]}
+    assert client.get("/pdf", headers=stale).status_code == 200
+
+def test_serve_file_ranges(client):
+    """Test partial content, unsatisfiable ranges and If-Range"""
+    response = client.get("/pdf", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    response = client.get("/pdf", headers={"Range": "bytes=5-3"})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+    response = client.get("/pdf", headers={"Range": "bytes=5000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+    response = client.get("/pdf", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
@@ -0,0 +1,229 @@
+import os
+import sys
+import threading
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.routes import router
+from app.db.database import Base, get_db
+from app.models.models import Batch, Document, Job
+from app.services import job_service
+from app.services.job_service import JobError, run_job, submit_job, run_batch, submit_batch, get_batch_status
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """File-backed SQLite sessions, one per pipeline thread"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+def _create_document(db):
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.commit()
+    return document.id
+
+def test_run_job_records_progress_timings_and_result(session_factory):
+    """Test that a job goes from queued through running to succeeded"""
+    db = session_factory()
+    document_id = _create_document(db)
+    seen = []
+
+    def stage(name):
+        def run(stage_db, document):
+            job = stage_db.get(Job, job_id)
+            seen.append((job.status, job.stage))
+            return {f"{name}ed_items": 2}
+        return run
+
+    with patch("app.services.job_service.get_job_executor") as mock_executor:
+        job = submit_job(db, document_id, "process")
+    job_id = job.id
+    assert job.status == "queued"
+    mock_executor.return_value.submit.assert_called_once_with(run_job, job_id)
+
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch.dict("app.services.job_service.STAGES", {"extract": stage("extract"), "match": stage("match")}):
+        run_job(job_id)
+
+    assert seen == [("running", "extract"), ("running", "match")]
+    db.expire_all()
+    job = db.get(Job, job_id)
+    assert job.status == "succeeded"
+    assert job.stage is None and job.error is None
+    assert set(job.timings) == {"queued", "extract", "match"}
+    assert job.result == {"extracted_items": 2, "matched_items": 2}
+    assert job.started_at is not None and job.finished_at is not None
+    db.close()
+
+def test_run_job_records_stage_error(session_factory):
+    """Test that a failing stage marks the job failed with its error"""
+    db = session_factory()
+    document_id = _create_document(db)
+
+    def extract(db, document):
+        raise JobError("Failed to extract content from document")
+
+    with patch("app.services.job_service.get_job_executor"):
+        job_id = submit_job(db, document_id, "extract").id
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch.dict("app.services.job_service.STAGES", {"extract": extract}):
+        run_job(job_id)
+
+    db.expire_all()
+    job = db.get(Job, job_id)
+    assert job.status == "failed"
+    assert job.error == "Failed to extract content from document"
+    assert job.finished_at is not None
+    db.close()
+
+def test_unknown_job_kind_is_rejected(session_factory):
+    """Test that jobs of an unknown kind are neither stored nor queued"""
+    db = session_factory()
+    document_id = _create_document(db)
+
+    with patch("app.services.job_service.get_job_executor") as mock_executor:
+        with pytest.raises(ValueError):
+            submit_job(db, document_id, "translate")
+
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        app.dependency_overrides[get_db] = lambda: db
+        response = TestClient(app).post(f"/api/documents/{document_id}/jobs", json={"kind": "translate"})
+
+    assert response.status_code == 400
+    mock_executor.assert_not_called()
+    assert db.query(Job).count() == 0
+    db.close()
+
+def _create_batch(db, size):
+    batch = Batch(status="queued")
+    db.add(batch)
+    db.flush()
+    for i in range(size):
+        document = Document(filename=f"po_{i}.pdf")
+        db.add(document)
+        db.flush()
+        db.add(Job(document_id=document.id, batch_id=batch.id, kind="process", status="queued", timings={}))
+    db.commit()
+    return batch.id
+
+def test_run_batch_overlaps_extraction_and_matching(session_factory):
+    """Test that the next document is extracted while the previous one is matched"""
+    db = session_factory()
+    batch_id = _create_batch(db, 3)
+
+    extracting = {i: threading.Event() for i in range(1, 4)}
+    overlapped = []
+
+    def extract(db, document):
+        extracting[document.id].set()
+        if document.id == 2:
+            raise ValueError("unreadable PDF")
+        return {"extracted_items": 1}
+
+    def match(db, document):
+        # Matching document 1 waits for extraction of the next document
+        if document.id == 1:
+            overlapped.append(extracting[2].wait(timeout=5))
+        return {"matched_items": 1}
+
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch.dict("app.services.job_service.STAGES", {"extract": extract, "match": match}):
+        run_batch(batch_id)
+
+    assert overlapped == [True]
+    db.expire_all()
+    status = get_batch_status(db, batch_id)
+    assert status["status"] == "completed"
+    assert status["counts"] == {"succeeded": 2, "failed": 1}
+    assert [row["status"] for row in status["documents"]] == ["succeeded", "failed", "succeeded"]
+    assert status["documents"][1]["error"] == "unreadable PDF"
+
+    job = db.get(Job, status["documents"][0]["job_id"])
+    assert set(job.timings) == {"queued", "extract", "match"}
+    assert job.result == {"extracted_items": 1, "matched_items": 1}
+    db.close()
+
+def test_run_batch_extracts_documents_concurrently(session_factory):
+    """Test that the documents of a batch are extracted by several workers at once"""
+    db = session_factory()
+    batch_id = _create_batch(db, 2)
+    both_extracting = threading.Barrier(2, timeout=5)
+
+    def extract(db, document):
+        both_extracting.wait()
+        return {"extracted_items": 1}
+
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch("app.services.job_service.BATCH_EXTRACT_WORKERS", 2), \
+            patch.dict("app.services.job_service.STAGES", {"extract": extract, "match": lambda db, document: {}}):
+        run_batch(batch_id)
+
+    db.expire_all()
+    assert get_batch_status(db, batch_id)["counts"] == {"succeeded": 2}
+    db.close()
+
+def test_run_batch_fails_unfinished_jobs_when_aborted(session_factory):
+    """Test that an aborted pipeline fails the batch and the jobs it did not finish"""
+    db = session_factory()
+    batch_id = _create_batch(db, 2)
+
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch("app.services.job_service._extract_batch_job", side_effect=RuntimeError("database gone")):
+        run_batch(batch_id)
+
+    db.expire_all()
+    status = get_batch_status(db, batch_id)
+    assert status["status"] == "failed"
+    assert status["finished_at"] is not None
+    assert status["counts"] == {"failed": 2}
+    assert status["documents"][0]["error"] == "Batch aborted before the job finished"
+    db.close()
+
+def test_run_batch_survives_matching_errors(session_factory):
+    """Test that the pipeline keeps draining when matching a job raises"""
+    db = session_factory()
+    batch_id = _create_batch(db, 4)
+    execute_job = job_service._execute_job
+
+    def execute_or_fail(db, job_id, stages=None, start=True, finish=True):
+        if stages == ("match",):
+            raise RuntimeError("database gone")
+        return execute_job(db, job_id, stages=stages, start=start, finish=finish)
+
+    with patch("app.services.job_service.SessionLocal", session_factory), \
+            patch("app.services.job_service.BATCH_PIPELINE_DEPTH", 1), \
+            patch("app.services.job_service._execute_job", side_effect=execute_or_fail), \
+            patch.dict("app.services.job_service.STAGES", {"extract": lambda db, document: {}}):
+        run_batch(batch_id)
+
+    db.expire_all()
+    status = get_batch_status(db, batch_id)
+    assert status["status"] == "failed"
+    assert status["counts"] == {"failed": 4}
+    db.close()
+
+def test_submit_batch_persists_rejected_files(session_factory):
+    """Test that files rejected at upload are reported by the batch status"""
+    db = session_factory()
+    document = Document(filename="po.pdf")
+    db.add(document)
+    db.commit()
+
+    with patch("app.services.job_service.get_job_executor"):
+        batch = submit_batch(db, [document.id], ["notes.txt", "scans.zip/broken.pdf"])
+
+    db.expire_all()
+    status = get_batch_status(db, batch.id)
+    assert status["rejected"] == ["notes.txt", "scans.zip/broken.pdf"]
+    assert status["counts"] == {"queued": 1}
+    db.close()
@@ -0,0 +1,73 @@
+import os
+import sys
+import pytest
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.local_extraction import parse_line_item_table, extract_line_items_locally
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "onsite_documents", "Example POs")
+
+def test_parse_line_item_table_with_wrapped_descriptions():
+    """Test that wrapped description lines are joined into one row per quantity"""
+    text = "\n".join([
+        "Request   Quote",
+        "",
+        "Item Description                       Quantity                 Unit Price              Total",
+        "Brass  Screw  M5 10mm   Uncoated",
+        "Coarse                                                     117                     42.2",
+        "Aluminum   Screw  M4  40mm   Zinc",
+        "Plated Coarse                                               25",
+    ])
+    
+    table, confidence = parse_line_item_table(text)
+    
+    assert confidence == 1.0
+    assert table["columns"] == ["Item Description", "Quantity", "Unit Price", "Total"]
+    assert table["rows"] == [
+        ["Brass Screw M5 10mm Uncoated Coarse", "117", "42.2", ""],
+        ["Aluminum Screw M4 40mm Zinc Plated Coarse", "25", "", ""],
+    ]
+
+def test_parse_line_item_table_stops_at_totals():
+    """Test that subtotal lines under the numeric columns end the table"""
+    text = "\n".join([
+        "  #     Description          Qty       Unit Price       Amount",
+        "  1     Product A              2          $100.00      $200.00",
+        "                                        Subtotal         $200.00",
+    ])
+    
+    table, confidence = parse_line_item_table(text)
+    
+    assert confidence == 1.0
+    assert table["rows"] == [["1", "Product A", "2", "$100.00", "$200.00"]]
+
+def test_parse_line_item_table_low_confidence_without_quantities():
+    """Test that description lines without a closing quantity lower the confidence"""
+    text = "\n".join([
+        "Item                                    Qty",
+        "Steel Nut 1/2\" 30mm                     117",
+        "Brass Stud 1/4\" 30mm",
+        "Aluminum Bolt 1/2\" 20mm",
+    ])
+    
+    table, confidence = parse_line_item_table(text)
+    
+    assert len(table["rows"]) == 1
+    assert confidence < 0.5
+
+def test_parse_line_item_table_without_header():
+    """Test that text without a line item header is not parsed"""
+    assert parse_line_item_table("Customer Name\nBrass Nut 1/2\" 20mm Galvanized Coarse") == (None, 0.0)
+
+def test_extract_line_items_locally_example_po():
+    """Test local extraction of a digitally generated example PO"""
+    with open(os.path.join(EXAMPLES_DIR, "Easy-1.pdf"), "rb") as pdf_file:
+        items, confidence = extract_line_items_locally(pdf_file)
+    
+    assert confidence == 1.0
+    assert items[0]["description"] == "TABLE_STRUCTURE"
+    assert len(items) == 6
+    assert items[1]["description"].startswith('Brass Nut 1/2" 20mm Galvanized Coarse | 143')
+    assert items[1]["quantity"] == 143
@@ -0,0 +1,51 @@
+import os
+import sys
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.metrics import Counter, Histogram, HTTP_REQUEST_SECONDS, MetricsMiddleware
+
+def test_histogram_renders_cumulative_buckets():
+    """Test the _bucket/_sum/_count series of a labelled histogram"""
+    histogram = Histogram("stage_seconds", "Stage latency", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, stage="match")
+    with histogram.time(stage="extract"):
+        pass
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP stage_seconds Stage latency", "# TYPE stage_seconds histogram"]
+    assert 'stage_seconds_bucket{stage="match",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="match",le="1.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="match",le="+Inf"} 4' in lines
+    assert 'stage_seconds_sum{stage="match"} 4.05' in lines
+    assert 'stage_seconds_count{stage="match"} 4' in lines
+    assert histogram.count(stage="extract") == 1
+
+def test_counter_escapes_label_values():
+    """Test counter increments and label escaping"""
+    counter = Counter("errors_total", "Errors", ("step",))
+    counter.inc(step='up"load')
+    counter.inc(2, step='up"load')
+    assert counter.render()[-1] == 'errors_total{step="up\\"load"} 3'
+
+def test_metrics_middleware_labels_route_templates():
+    """Test that requests are observed per route template and status"""
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    before = HTTP_REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status="200")
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    assert HTTP_REQUEST_SECONDS.count(method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert HTTP_REQUEST_SECONDS.count(method="GET", route="unmatched", status="404") >= 1
@@ -0,0 +1,116 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.models import ProductCatalog
+from app.services.catalog_index import CatalogIndex
+from sqlalchemy.dialects import postgresql
+
+from app.services.product_search import (
+    ensure_search_index,
+    search_products,
+    search_products_batch,
+    postgresql_search_statement
+)
+
+DESCRIPTIONS = [
+    "Steel Bolt M4 10mm Zinc Plated Coarse",
+    "Steel Bolt M4 20mm Zinc Plated Coarse",
+    "Steel Bolt M6 10mm Plain Fine",
+    "Brass Nut M4 Plain Coarse",
+    "Stainless Steel Washer M8 Plain",
+]
+
+def test_search_products_sqlite_fts(db):
+    """Test that the FTS5 search ranks full matches first and honours the limit"""
+    # Products added before the index exist are picked up by the rebuild
+    db.add_all([ProductCatalog(description=description) for description in DESCRIPTIONS[:3]])
+    db.commit()
+    ensure_search_index(db.get_bind())
+    ensure_search_index(db.get_bind())  # idempotent
+
+    # Products added afterwards are indexed by the triggers
+    db.add_all([ProductCatalog(description=description) for description in DESCRIPTIONS[3:]])
+    db.commit()
+
+    results = search_products(db, "bolt m4 10", 3)
+    assert [product.description for product in results][0] == "Steel Bolt M4 10mm Zinc Plated Coarse"
+    assert len(results) == 3
+
+    # Terms missing from every product fall back to any-term matches
+    results = search_products(db, "brass nut m4 | 100 | pcs", 2)
+    assert results[0].description == "Brass Nut M4 Plain Coarse"
+    assert len(results) == 2
+
+    assert search_products(db, "washer", 10)[0].description == "Stainless Steel Washer M8 Plain"
+    assert search_products(db, "  ", 3) == []
+
+    # Updated descriptions are re-indexed
+    washer = db.query(ProductCatalog).filter_by(description="Stainless Steel Washer M8 Plain").one()
+    washer.description = "Stainless Steel Lock Washer M8 Plain"
+    db.commit()
+    assert search_products(db, "lock washer", 3)[0].id == washer.id
+
+def test_search_products_short_queries(db):
+    """Test that short and partial queries still find long descriptions"""
+    db.add_all([ProductCatalog(description=description) for description in DESCRIPTIONS])
+    db.add(ProductCatalog(description="Stainless Steel Bolt 1/2 10mm Zinc Plated Coarse"))
+    db.commit()
+    ensure_search_index(db.get_bind())
+
+    assert len(search_products(db, "M4", 10)) == 3
+    assert search_products(db, "1/2", 3)[0].description == "Stainless Steel Bolt 1/2 10mm Zinc Plated Coarse"
+    assert {product.description for product in search_products(db, "stain", 5)} == {
+        "Stainless Steel Washer M8 Plain",
+        "Stainless Steel Bolt 1/2 10mm Zinc Plated Coarse",
+    }
+
+def test_postgresql_search_statement_matches_substrings():
+    """Test that the trigram search accepts substrings and word-similar text, ranked by word similarity"""
+    statement = postgresql_search_statement("50%_M4", 5)
+    compiled = statement.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+
+    assert "product_catalog.description ILIKE" in sql
+    assert "<%% product_catalog.description" in sql
+    assert "ORDER BY word_similarity(" in sql
+    assert "%50\\%\\_M4%" in compiled.params.values()
+
+@patch("app.services.product_search.get_catalog_index")
+def test_search_products_batch(mock_get_index, db):
+    """Test that batch search answers every query with its own limit in request order"""
+    products = [ProductCatalog(description=description) for description in DESCRIPTIONS]
+    db.add_all(products)
+    db.commit()
+    # The last catalog row is not in the database and is never returned
+    mock_get_index.return_value = CatalogIndex(
+        [{"Description": product.description, "id": product.id} for product in products]
+        + [{"Description": "Steel Bolt M4 10mm Zinc Plated Coarse Long"}]
+    )
+
+    results = search_products_batch(db, [
+        ("Steel Bolt M4 10mm Zinc | 100 | 0.25", 2),
+        ("", 3),
+        ("brass nut", 1),
+        ("washer m8", 5),
+    ])
+
+    assert [product.description for product in results[0]] == DESCRIPTIONS[:2]
+    assert results[1] == []
+    assert [product.description for product in results[2]] == ["Brass Nut M4 Plain Coarse"]
+    assert results[3][0].description == "Stainless Steel Washer M8 Plain"
+    assert all(product.id is not None for product in results[3])
+
+    # The best match is the CSV-only row; the next one takes its slot
+    results = search_products_batch(db, [("Steel Bolt M4 10mm Zinc Plated Coarse Long", 1)])
+    assert [product.description for product in results[0]] == [DESCRIPTIONS[0]]
+
+    # Without any imported product nothing is ranked at all
+    mock_get_index.return_value = CatalogIndex([{"Description": description} for description in DESCRIPTIONS])
+    with patch("app.services.product_search.get_tfidf_matrix") as mock_matrix:
+        assert search_products_batch(db, [("brass nut", 3)]) == [[]]
+    mock_matrix.assert_not_called()
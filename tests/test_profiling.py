@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.profiling import ProfilingMiddleware, list_profiles, get_profile_path
+
+def busy_matching(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/match")
+    def match():
+        busy_matching(0.1)
+        return {"success": True}
+
+    with patch("app.services.profiling.PROFILE_DIR", str(tmp_path)):
+        yield TestClient(app)
+
+def test_profiling_only_when_requested(client):
+    """Test that only flagged requests are profiled, including thread pool work"""
+    assert "x-profile-name" not in client.get("/match").headers
+    assert list_profiles() == []
+
+    response = client.get("/match", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    name = response.headers["x-profile-name"]
+
+    client.get("/match?profile=1")
+    profiles = list_profiles()
+    assert len(profiles) == 2
+    assert profiles[1]["name"] == name
+
+    with open(get_profile_path(name)) as profile:
+        stacks = profile.read().splitlines()
+    assert any("busy_matching (test_profiling.py" in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+def test_get_profile_path_rejects_other_files(client):
+    """Test that only profile files in the profile directory are served"""
+    assert get_profile_path("../conftest.py") is None
+    assert get_profile_path("missing.folded") is None
@@ -0,0 +1,60 @@
+import io
+import os
+import sys
+import asyncio
+import hashlib
+import zipfile
+import pytest
+from unittest.mock import patch
+from fastapi import UploadFile
+
+# Add parent directory to path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.upload_service import UploadTooLargeError, stream_upload_to_disk, move_upload_into_place, unpack_pdfs_from_zip
+
+def test_stream_upload_to_disk_hashes_in_chunks(tmp_path):
+    """Test that an upload is written in chunks with its SHA-256 and moved into place"""
+    content = os.urandom(10_000)
+    upload = UploadFile(io.BytesIO(content), filename="po.pdf")
+
+    with patch("app.services.upload_service.UPLOAD_CHUNK_SIZE", 1024):
+        temp_path, sha256, size = asyncio.run(stream_upload_to_disk(upload, str(tmp_path)))
+
+    assert sha256 == hashlib.sha256(content).hexdigest()
+    assert size == len(content)
+
+    file_path = str(tmp_path / "document_1.pdf")
+    asyncio.run(move_upload_into_place(temp_path, file_path))
+    assert not os.path.exists(temp_path)
+    with open(file_path, "rb") as stored:
+        assert stored.read() == content
+
+def test_stream_upload_to_disk_enforces_max_size(tmp_path):
+    """Test that an oversized upload is rejected and leaves no file behind"""
+    upload = UploadFile(io.BytesIO(b"x" * 5000), filename="po.pdf")
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(stream_upload_to_disk(upload, str(tmp_path), max_size=4096))
+
+    assert os.listdir(tmp_path) == []
+
+def test_unpack_pdfs_from_zip(tmp_path):
+    """Test that PDF members are unpacked and hashed and other members rejected"""
+    archive_path = tmp_path / "batch.zip"
+    big = b"%PDF" + b"0" * 5000
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("pos/po_1.pdf", b"%PDF-1.4 one")
+        archive.writestr("pos/big.pdf", big)
+        archive.writestr("notes.txt", b"hello")
+        archive.writestr("__MACOSX/pos/._po_1.pdf", b"resource fork")
+    unpack_dir = tmp_path / "blobs"
+    unpack_dir.mkdir()
+
+    unpacked, rejected = unpack_pdfs_from_zip(str(archive_path), str(unpack_dir), max_size=4096)
+
+    assert [(name, sha256, size) for name, _, sha256, size in unpacked] == [
+        ("po_1.pdf", hashlib.sha256(b"%PDF-1.4 one").hexdigest(), 12)
+    ]
+    assert rejected == ["pos/big.pdf", "notes.txt"]
+    assert os.listdir(unpack_dir) == [os.path.basename(unpacked[0][1])]